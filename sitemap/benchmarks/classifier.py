@@ -0,0 +1,118 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+'''Compare URL classification with the classifier and a list of regexes.
+
+The URLs are read from a sitemap file, for example a previous
+sitemap_docs.openstack.org.xml, or from a text file with one URL per line.
+Without a file, URLs are generated. Run from the sitemap directory:
+
+    python -m benchmarks.classifier sitemap_docs.openstack.org.xml
+'''
+
+import argparse
+import re
+import time
+
+from lxml import etree
+from scrapy import linkextractors
+from scrapy.utils import url as url_utils
+
+from generator import classifier
+from generator.spiders import sitemap_file
+
+RELEASES = classifier.load_table(sitemap_file.RELEASES)['classes']
+MAINTAINED = RELEASES['maintained']['segments']
+RETIRED = RELEASES['retired']['segments']
+
+
+def read_urls(path):
+    if path.endswith('.xml'):
+        urls = []
+        for event, element in etree.iterparse(path):
+            if element.tag.endswith('}loc'):
+                urls.append(element.text.strip())
+            element.clear()
+        return urls
+    with open(path) as url_file:
+        return [line.strip() for line in url_file if line.strip()]
+
+
+def generate_urls(count):
+    # Mostly current documents, like the links found on docs.o.o
+    series = ['latest'] * 6 + ['install-guide', 'contributor'] * 2
+    series.extend(MAINTAINED)
+    series.extend(RETIRED[-4:])
+    return ['https://docs.openstack.org/project-%d/%s/admin/page-%d.html'
+            % (i % 300, series[i % len(series)], i) for i in range(count)]
+
+
+def regex_classifier():
+    '''Checks done by the LinkExtractor rule and parse_item before.'''
+    spider = sitemap_file.SitemapSpider
+    deny_extensions = ['.' + e for e in linkextractors.IGNORED_EXTENSIONS
+                       if e != 'pdf']
+    allow = [re.compile(p) for p in
+             [r'.*\.html', r'.*\.pdf', r'.*\.xml', r'.*\.txt', r'.*/']]
+    deny = [re.compile('/%s/' % re.escape(s)) for s in RETIRED]
+    maint = re.compile('^.*/(' + '|'.join(MAINTAINED) + ')/')
+    latest = re.compile('^.*/latest/')
+
+    def classify(url):
+        if not any(p.search(url) for p in allow):
+            return None
+        if any(p.search(url) for p in deny):
+            return None
+        if url_utils.url_is_from_any_domain(url, spider.DENY_DOMAINS):
+            return None
+        if url_utils.url_has_any_extension(url, deny_extensions):
+            return None
+        path = sitemap_file.urlparse.urlsplit(url).path
+        if maint.match(path):
+            return ('1.0', 'weekly')
+        elif latest.match(path):
+            return ('0.5', 'daily')
+        return ('1.0', 'daily')
+
+    return classify
+
+
+def measure(name, classify, urls, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        for url in urls:
+            classify(url)
+    elapsed = time.perf_counter() - start
+    print('%-12s %10.0f URLs/s' % (name, len(urls) * rounds / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', nargs='?',
+                        help='sitemap or text file with URLs')
+    parser.add_argument('--count', type=int, default=200000,
+                        help='number of generated URLs')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.path:
+        urls = read_urls(args.path)
+    else:
+        urls = generate_urls(args.count)
+    measure('regex list', regex_classifier(), urls, args.rounds)
+    measure('classifier',
+            sitemap_file.SitemapSpider.url_classifier.classify,
+            urls, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
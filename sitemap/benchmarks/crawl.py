@@ -0,0 +1,147 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+'''Benchmark a sitemap crawl of a synthetic documentation site.
+
+A site is generated with benchmarks.site, served by a local HTTP server in
+a separate process and crawled with the sitemap spider and pipelines.
+Throughput, peak memory and the time spent writing the sitemap are
+reported. Run from the sitemap directory:
+
+    python -m benchmarks.crawl --pages 5000 --pdf-size 1000000
+
+With --replay, the responses recorded by a crawl with SITEMAP_RECORD are
+replayed instead, so only the spider and pipelines are measured:
+
+    python -m benchmarks.crawl --replay responses.db
+'''
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+from scrapy import crawler
+from scrapy.utils import project
+
+from benchmarks import site
+from generator import extensions
+from generator.spiders import sitemap_file
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(root, port):
+    server = multiprocessing.Process(target=site.serve, args=(root, port),
+                                     daemon=True)
+    server.start()
+    for i in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('HTTP server did not start')
+
+
+def crawl(domain, scheme, settings):
+    process = crawler.CrawlerProcess(settings)
+    sitemap_crawler = process.create_crawler(sitemap_file.SitemapSpider)
+    process.crawl(sitemap_crawler, domain=domain, scheme=scheme)
+    start = time.perf_counter()
+    process.start()
+    return time.perf_counter() - start, sitemap_crawler.stats.get_stats()
+
+
+def timing_total(stats, stage):
+    histogram = stats.get('sitemap/timing/%s' % stage)
+    return histogram.total if histogram is not None else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    site.add_arguments(parser)
+    parser.add_argument('-s', dest='settings', action='append', default=[],
+                        metavar='NAME=VALUE', help='set a Scrapy setting')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the site and the output directory')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay recorded responses instead of '
+                             'crawling a generated site')
+    parser.add_argument('--domain', default='docs.openstack.org',
+                        help='domain of the recorded crawl')
+    parser.add_argument('--scheme', default='https',
+                        help='scheme of the recorded crawl')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='sitemap-benchmark-')
+    root = os.path.join(tmpdir, 'site')
+    output = os.path.join(tmpdir, 'output')
+    os.makedirs(output)
+    files = 0
+    if not args.replay:
+        files = site.generate_from_args(root, args)
+
+    settings = project.get_project_settings()
+    settings.set('LOG_LEVEL', 'WARNING')
+    settings.set('SITEMAP_REPORT_INTERVAL', 0)
+    for setting in args.settings:
+        name, _, value = setting.partition('=')
+        settings.set(name, value, priority='cmdline')
+
+    server = None
+    if args.replay:
+        settings.set('SITEMAP_REPLAY', os.path.abspath(args.replay),
+                     priority='cmdline')
+        domain, scheme = args.domain, args.scheme
+    else:
+        port = free_port()
+        server = start_server(root, port)
+        domain, scheme = '127.0.0.1:%d' % port, 'http'
+    cwd = os.getcwd()
+    os.chdir(output)
+    try:
+        elapsed, stats = crawl(domain, scheme, settings)
+    finally:
+        os.chdir(cwd)
+        if server is not None:
+            server.terminate()
+            server.join()
+
+    pages = stats.get('response_received_count', 0)
+    write_time = sum(timing_total(stats, stage)
+                     for stage in ('export', 'export_write', 'export_close'))
+    peak_rss = extensions.get_peak_rss()
+    print('files in site     %10d' % files)
+    print('pages crawled     %10d' % pages)
+    print('URLs in sitemap   %10d' % stats.get('item_scraped_count', 0))
+    print('elapsed           %10.2f s' % elapsed)
+    print('pages/s           %10.1f' % (pages / elapsed))
+    print('peak RSS          %10.1f MiB'
+          % (peak_rss / 2.0 ** 20 if peak_rss else 0.0))
+    print('sitemap write     %10.3f s' % write_time)
+    if args.keep:
+        print('site and output kept in %s' % tmpdir)
+    else:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
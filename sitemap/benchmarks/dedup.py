@@ -0,0 +1,61 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+'''Compare the memory use of URL de-duplication stores.
+
+Memory is measured with tracemalloc, the on-disk table lives in the page
+cache and does not show up. Run from the sitemap directory:
+
+    python -m benchmarks.dedup 1000000 10000000
+'''
+
+import argparse
+import tracemalloc
+
+from generator import fingerprints
+
+
+def generate_urls(count):
+    for i in range(count):
+        yield ('https://docs.openstack.org/project-%d/latest/'
+               'admin/section-%d/page-%d.html' % (i % 500, i % 37, i))
+
+
+def measure(name, store, count):
+    tracemalloc.start()
+    for url in generate_urls(count):
+        if url not in store:
+            store.add(url)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('%-20s %10d URLs %8.1f MiB %8.1f MiB peak'
+          % (name, count, current / 2.0 ** 20, peak / 2.0 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('counts', nargs='*', type=int,
+                        default=[1000000, 10000000])
+    parser.add_argument('--path', help='file for the on-disk table')
+    args = parser.parse_args()
+
+    for count in args.counts:
+        measure('set', set(), count)
+        measure('FingerprintSet', fingerprints.FingerprintSet(), count)
+        if args.path:
+            store = fingerprints.FingerprintSet(args.path)
+            measure('FingerprintSet/disk', store, count)
+            store.close()
+
+
+if __name__ == '__main__':
+    main()
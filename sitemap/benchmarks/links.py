@@ -0,0 +1,78 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+'''Compare link extraction with the Scrapy LinkExtractor.
+
+The pages are read from HTML files, for example a saved configuration
+reference, or generated to look like large Sphinx pages with a long
+table of contents. Run from the sitemap directory:
+
+    python -m benchmarks.links --links 3000
+'''
+
+import argparse
+import time
+
+from scrapy import http
+from scrapy import linkextractors
+
+from generator import links
+
+
+def generate_page(count):
+    toc = ''.join('<li><a class="reference internal" href="#section-%d">'
+                  'Section %d</a></li>\n' % (i, i) for i in range(count // 3))
+    body = ''.join('<div class="section" id="section-%d"><h2>Section %d</h2>'
+                   '<p>See <a href="../ref/option-%d.html">option %d</a> and '
+                   '<a href="/nova/latest/admin/page-%d.html">the guide</a>.'
+                   '</p></div>\n' % (i, i, i, i, i)
+                   for i in range(count // 3))
+    return ('<html><head><title>Configuration</title></head><body>'
+            '<ul>%s</ul>%s</body></html>' % (toc, body)).encode('utf-8')
+
+
+def measure(name, extractor, responses, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        for response in responses:
+            found = extractor.extract_links(response)
+    elapsed = time.perf_counter() - start
+    print('%-16s %8.1f pages/s %6d links/page'
+          % (name, len(responses) * rounds / elapsed, len(found)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('paths', nargs='*', help='HTML files')
+    parser.add_argument('--links', type=int, default=3000,
+                        help='number of links in generated pages')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    url = 'https://docs.openstack.org/nova/latest/configuration/config.html'
+    if args.paths:
+        bodies = []
+        for path in args.paths:
+            with open(path, 'rb') as html_file:
+                bodies.append(html_file.read())
+    else:
+        bodies = [generate_page(args.links)]
+    responses = [http.HtmlResponse(url, body=body, encoding='utf-8')
+                 for body in bodies]
+    measure('LinkExtractor', linkextractors.LinkExtractor(deny_extensions=[]),
+            responses, args.rounds)
+    measure('HrefLinkExtractor', links.HrefLinkExtractor(),
+            responses, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
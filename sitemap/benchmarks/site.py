@@ -0,0 +1,158 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+'''Generate a synthetic documentation site for crawl benchmarks.
+
+The site looks like docs.openstack.org: projects with a directory per
+release series, Sphinx-like HTML pages linking to each other and a PDF
+file per project and series. Run from the sitemap directory:
+
+    python -m benchmarks.site /tmp/docs --pages 5000 --serve 8000
+'''
+
+import argparse
+import functools
+import http.server
+import os
+import random
+
+
+PAGE = '''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>%(title)s</title></head>
+<body>
+<div class="sphinxsidebar"><ul>%(toc)s</ul></div>
+<div class="document"><h1>%(title)s</h1>%(text)s<p>%(links)s</p></div>
+</body>
+</html>
+'''
+
+TEXT = ('<p>OpenStack is a cloud operating system that controls large pools '
+        'of compute, storage, and networking resources.</p>\n')
+
+
+def link(href, text):
+    return '<a class="reference internal" href="%s">%s</a>' % (href, text)
+
+
+def write_page(path, title, toc, links, paragraphs):
+    with open(path, 'w') as page:
+        page.write(PAGE % {
+            'title': title,
+            'toc': ''.join('<li>%s</li>' % item for item in toc),
+            'text': TEXT * paragraphs,
+            'links': ' '.join(links),
+        })
+
+
+def generate(root, pages=1000, fanout=10, series=('latest',), projects=None,
+             pdf_size=0, paragraphs=20, seed=0):
+    '''Write a synthetic site below root and return the number of files.
+
+    The pages are spread over ``projects`` projects, by default one per
+    100 pages, and the given release series directories. Every page links
+    to the index of its project and series and to ``fanout`` random pages
+    of the same directory. With ``pdf_size`` set, every project and series
+    gets a PDF file of that many bytes.
+    '''
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    projects = projects or max(1, pages // 100)
+    directories = ['project-%d/%s' % (project, name)
+                   for project in range(projects) for name in series]
+    per_directory = max(1, pages // len(directories))
+    count = 0
+    for directory in directories:
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+        names = ['page-%d.html' % i for i in range(per_directory)]
+        toc = [link(name, name) for name in names[:50]]
+        if pdf_size:
+            with open(os.path.join(root, directory, 'doc.pdf'), 'wb') as pdf:
+                pdf.write(b'%PDF-1.4\n' + b'0' * max(0, pdf_size - 9))
+            toc.append(link('doc.pdf', 'PDF'))
+            count += 1
+        write_page(os.path.join(root, directory, 'index.html'), directory,
+                   toc, [link('../../index.html', 'Home')], paragraphs)
+        count += 1
+        for name in names:
+            targets = rng.sample(names, min(fanout, len(names)))
+            write_page(os.path.join(root, directory, name), name,
+                       [link('index.html', 'Contents')],
+                       [link(target, target) for target in targets],
+                       paragraphs)
+            count += 1
+    write_page(os.path.join(root, 'index.html'), 'Documentation',
+               [link(directory + '/index.html', directory)
+                for directory in directories], [], 1)
+    return count + 1
+
+
+class Server(http.server.ThreadingHTTPServer):
+    # The default backlog of 5 connections makes the kernel drop
+    # connections of a crawl with a higher concurrency
+    request_queue_size = 1024
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    # Keep connections open like production web servers do
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(root, port):
+    '''Serve root on localhost until interrupted.'''
+    handler = functools.partial(QuietHandler, directory=root)
+    Server(('127.0.0.1', port), handler).serve_forever()
+
+
+def add_arguments(parser):
+    parser.add_argument('--pages', type=int, default=1000,
+                        help='number of HTML pages (default: %(default)s)')
+    parser.add_argument('--fanout', type=int, default=10,
+                        help='links to other pages per page '
+                             '(default: %(default)s)')
+    parser.add_argument('--series', default='latest,2026.1,2025.2,zed',
+                        help='comma separated release series directories '
+                             '(default: %(default)s)')
+    parser.add_argument('--projects', type=int,
+                        help='number of projects (default: pages / 100)')
+    parser.add_argument('--pdf-size', type=int, default=0,
+                        help='size of the PDF files in bytes, 0 for none '
+                             '(default: %(default)s)')
+    parser.add_argument('--paragraphs', type=int, default=20,
+                        help='paragraphs of text per page '
+                             '(default: %(default)s)')
+
+
+def generate_from_args(root, args):
+    return generate(root, pages=args.pages, fanout=args.fanout,
+                    series=args.series.split(','), projects=args.projects,
+                    pdf_size=args.pdf_size, paragraphs=args.paragraphs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', help='directory of the site')
+    add_arguments(parser)
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='serve the site on localhost after generating')
+    args = parser.parse_args()
+
+    print('%d files written' % generate_from_args(args.root, args))
+    if args.serve:
+        serve(args.root, args.serve)
+
+
+if __name__ == '__main__':
+    main()
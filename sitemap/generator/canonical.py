@@ -0,0 +1,54 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import urllib.parse as urlparse
+
+
+class UrlCanonicalizer(object):
+    '''Map the different URLs of a page to a single canonical URL.
+
+    The fragment is always removed. Optionally, the query string is
+    removed, index files are replaced by their directory and names
+    without an extension get a trailing slash, as the web server redirects
+    them to the directory anyway.
+    '''
+
+    def __init__(self, index_files=('index.html',), strip_query=True,
+                 trailing_slash=True):
+        self.index_files = frozenset(index_files)
+        self.strip_query = strip_query
+        self.trailing_slash = trailing_slash
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            index_files=settings.getlist('SITEMAP_CANONICAL_INDEX_FILES',
+                                         ['index.html']),
+            strip_query=settings.getbool('SITEMAP_CANONICAL_STRIP_QUERY',
+                                         True),
+            trailing_slash=settings.getbool(
+                'SITEMAP_CANONICAL_TRAILING_SLASH', True))
+
+    def canonicalize(self, url):
+        '''Return the canonical form of a URL.'''
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if not netloc:
+            return url
+        if self.strip_query:
+            query = ''
+        name = path[path.rfind('/') + 1:]
+        if name in self.index_files:
+            path = path[:-len(name)]
+        elif self.trailing_slash and name and '.' not in name:
+            path += '/'
+        return urlparse.urlunsplit((scheme, netloc.lower(), path or '/',
+                                    query, ''))
@@ -0,0 +1,138 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import re
+import urllib.parse as urlparse
+
+import yaml
+
+
+# daily changefrequency and highest priority for current files
+DEFAULT_CLASS = ('1.0', 'daily')
+
+
+def load_table(path):
+    '''Read a release table like releases.yaml.'''
+    with open(path) as table_file:
+        return yaml.safe_load(table_file)
+
+
+class UrlClassifier(object):
+    '''Decide if a URL belongs to the sitemap and how it is ranked.
+
+    Instead of testing a list of regular expressions, the directory names
+    of the URL path are looked up in a single table built from the release
+    series, so a URL is classified in one pass over its path.
+
+    The classes are pairs of directory names and their classification, a
+    tuple of priority and change frequency, ordered by precedence. A
+    classification of None denies all URLs below one of the directories.
+    The crawl priorities of the classes decide which URLs are requested
+    first, they default to 0.
+    '''
+
+    def __init__(self, classes, default=DEFAULT_CLASS, allow=(),
+                 deny_domains=(), deny_extensions=(), crawl_priorities=(),
+                 default_crawl_priority=0):
+        self.classes = []
+        self.segments = {}
+        for rank, (segments, classification) in enumerate(classes):
+            self.classes.append(classification)
+            for segment in segments:
+                self.segments.setdefault(segment, rank)
+        self.default = default
+        self.crawl_priorities = list(crawl_priorities)
+        missing = len(self.classes) - len(self.crawl_priorities)
+        self.crawl_priorities += [0] * missing
+        self.default_crawl_priority = default_crawl_priority
+        self.allow = re.compile('|'.join(allow)) if allow else None
+        self.deny_domains = tuple(domain.lower() for domain in deny_domains)
+        self.deny_subdomains = tuple('.' + domain
+                                     for domain in self.deny_domains)
+        # Extensions are looked up by the part after the last dot, the
+        # few extensions containing a dot are tested separately
+        self.deny_extensions = set()
+        self.deny_compound_extensions = ()
+        for extension in deny_extensions:
+            extension = '.' + extension.lower()
+            if '.' in extension[1:]:
+                self.deny_compound_extensions += (extension,)
+            else:
+                self.deny_extensions.add(extension)
+
+    @classmethod
+    def from_table(cls, table, **kwargs):
+        '''Create a classifier from a release table, see releases.yaml.'''
+        classes = []
+        crawl_priorities = []
+        for name, entry in table['classes'].items():
+            classification = None
+            if entry.get('priority') is not None:
+                classification = (str(entry['priority']),
+                                  entry['changefreq'])
+            # YAML turns unquoted series like 2026.1 into numbers
+            segments = [str(segment) for segment in entry['segments']]
+            classes.append((segments, classification))
+            crawl_priorities.append(entry.get('crawl_priority', 0))
+        default = table.get('default')
+        if default is not None:
+            kwargs['default'] = (str(default['priority']),
+                                 default['changefreq'])
+            kwargs['default_crawl_priority'] = default.get('crawl_priority',
+                                                           0)
+        return cls(classes, crawl_priorities=crawl_priorities, **kwargs)
+
+    def classify(self, url):
+        '''Return priority and change frequency or None for denied URLs.'''
+        components = urlparse.urlsplit(url)
+        host = components.netloc.rpartition('@')[2].partition(':')[0].lower()
+        if host in self.deny_domains or host.endswith(self.deny_subdomains):
+            return None
+        return self.classify_path(components.path, url)
+
+    def classify_path(self, path, url=None):
+        '''Classify a URL path, see classify.'''
+        name = path[path.rfind('/') + 1:].lower()
+        dot = name.rfind('.')
+        if dot >= 0 and name[dot:] in self.deny_extensions:
+            return None
+        if name.endswith(self.deny_compound_extensions):
+            return None
+        if self.allow is not None and not self.allow.search(url or path):
+            return None
+        rank = self.rank(path)
+        if rank is None:
+            return self.default
+        return self.classes[rank]
+
+    def rank(self, path):
+        '''Return the index of the class of a path or None for the default.
+
+        The class of a denied path has the classification None.
+        '''
+        best = None
+        for segment in path.split('/')[1:-1]:
+            rank = self.segments.get(segment)
+            if rank is None:
+                continue
+            if self.classes[rank] is None:
+                return rank
+            if best is None or rank < best:
+                best = rank
+        return best
+
+    def crawl_priority(self, url):
+        '''Return the crawl priority of a URL, higher goes first.'''
+        rank = self.rank(urlparse.urlsplit(url).path)
+        if rank is None:
+            return self.default_crawl_priority
+        return self.crawl_priorities[rank]
@@ -0,0 +1,88 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import itertools
+import os
+
+from scrapy import commands
+from scrapy import exceptions
+
+from .. import pipelines
+from .. import sitemaps
+from ..spiders import sitemap_file
+
+
+class Command(commands.ScrapyCommand):
+    '''Remove URLs which are not part of the sitemap from sitemaps.
+
+    The sitemaps are read and written as a stream, so memory use does not
+    depend on their size. URLs are filtered with the same rules as the
+    crawl. The filtered sitemaps are named after the domain of their URLs,
+    like the sitemaps of a crawl.
+    '''
+
+    requires_project = True
+    requires_crawler_process = False
+
+    def syntax(self):
+        return '[options] <sitemap> [<sitemap> ...]'
+
+    def short_desc(self):
+        return 'Filter existing sitemaps with the rules of the crawl'
+
+    def add_options(self, parser):
+        super(Command, self).add_options(parser)
+        parser.add_argument('--output-dir', default='filtered',
+                            help='directory of the filtered sitemaps '
+                                 '(default: %(default)s)')
+
+    def run(self, args, opts):
+        if not args or not all(os.path.isfile(path) for path in args):
+            raise exceptions.UsageError()
+        paths = [os.path.abspath(path) for path in args]
+        output_dir = os.path.abspath(opts.output_dir)
+        if any(os.path.dirname(path) == output_dir for path in paths):
+            raise exceptions.UsageError(
+                'The output directory must not contain the sitemaps')
+        classify = sitemap_file.SitemapSpider.url_classifier.classify
+        counts = {'read': 0, 'kept': 0}
+
+        def read():
+            for path in paths:
+                for entry in sitemaps.iter_items(path):
+                    counts['read'] += 1
+                    yield entry
+
+        def keep(entries):
+            for entry in entries:
+                if classify(entry['loc']) is not None:
+                    counts['kept'] += 1
+                    yield sitemap_file.SitemapItem.from_entry(entry)
+
+        found = read()
+        first = next(found, None)
+        if first is None:
+            raise exceptions.UsageError('The sitemaps contain no URLs')
+        # The output is named after the sitemap, URLs of other domains get
+        # their own sitemap
+        spider = sitemap_file.SitemapSpider(
+            domain=pipelines.item_domain(first))
+        exporter = pipelines.ExportSitemap.from_settings(self.settings)
+        os.makedirs(output_dir, exist_ok=True)
+        cwd = os.getcwd()
+        # The sitemap files are written to the working directory
+        os.chdir(output_dir)
+        try:
+            exporter.export(spider, keep(itertools.chain([first], found)))
+        finally:
+            os.chdir(cwd)
+        print('Kept %(kept)d of %(read)d URLs' % counts)
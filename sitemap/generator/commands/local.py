@@ -0,0 +1,50 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+
+from scrapy import commands
+from scrapy import exceptions
+
+from .. import canonical
+from .. import local
+from .. import pipelines
+from ..spiders import sitemap_file
+
+
+class Command(commands.ScrapyCommand):
+    '''Generate a sitemap from a local copy of the site.'''
+
+    requires_project = True
+    requires_crawler_process = False
+
+    def syntax(self):
+        return '[options] <directory>'
+
+    def short_desc(self):
+        return 'Generate a sitemap from a local copy of the site'
+
+    def add_options(self, parser):
+        super(Command, self).add_options(parser)
+        parser.add_argument('--domain', default='docs.openstack.org',
+                            help='domain the directory is published on '
+                                 '(default: %(default)s)')
+
+    def run(self, args, opts):
+        if len(args) != 1 or not os.path.isdir(args[0]):
+            raise exceptions.UsageError()
+        spider = sitemap_file.SitemapSpider(domain=opts.domain)
+        # URLs are written like the crawl requests them
+        spider.canonicalizer = canonical.UrlCanonicalizer.from_settings(
+            self.settings)
+        exporter = pipelines.ExportSitemap.from_settings(self.settings)
+        exporter.export(spider, local.walk_tree(args[0], spider))
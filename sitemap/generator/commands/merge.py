@@ -0,0 +1,63 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import glob
+import os
+
+from scrapy import commands
+from scrapy import exceptions
+
+from .. import extensions
+from .. import pipelines
+from .. import sitemaps
+from ..spiders import sitemap_file
+
+
+class Command(commands.ScrapyCommand):
+    '''Merge partial sitemaps of a distributed crawl.
+
+    Every domain found in the sitemaps gets its own merged sitemap in the
+    working directory, named like the sitemap of a crawl. Existing sitemaps
+    are never overwritten.
+    '''
+
+    requires_project = True
+    requires_crawler_process = False
+
+    def syntax(self):
+        return '[options] <sitemap> [<sitemap> ...]'
+
+    def short_desc(self):
+        return 'Merge partial sitemaps into one sorted sitemap'
+
+    def run(self, args, opts):
+        if not args or not all(os.path.isfile(path) for path in args):
+            raise exceptions.UsageError()
+        entries = sitemaps.merge(args)
+        domains = sorted(set(pipelines.item_domain(entry)
+                             for entry in entries))
+        if not domains:
+            raise exceptions.UsageError('The sitemaps contain no URLs')
+        exporter = pipelines.ExportSitemap.from_settings(self.settings)
+        for domain in domains:
+            name = glob.escape(extensions.output_name(domain))
+            # A single sitemap, or an index with its shards
+            patterns = [name + exporter.suffix, name + '-index.xml',
+                        name + '-[0-9][0-9][0-9][0-9]' + exporter.suffix]
+            existing = [path for pattern in patterns
+                        for path in glob.glob(pattern)]
+            if existing:
+                raise exceptions.UsageError(
+                    'The sitemap %s exists already' % existing[0])
+        spider = sitemap_file.SitemapSpider(domain=','.join(domains))
+        exporter.export(spider, (sitemap_file.SitemapItem.from_entry(entry)
+                                 for entry in entries))
@@ -0,0 +1,511 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import bisect
+import functools
+import json
+import logging
+import os
+import sys
+import time
+
+from scrapy import exceptions
+from scrapy import signals
+from scrapy.utils.defer import deferred_from_coro
+from twisted.python import failure
+
+from . import linkgraph
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+try:
+    from scrapy.utils.asyncio import create_looping_call
+except ImportError:  # Scrapy < 2.13
+    from twisted.internet import task
+    create_looping_call = task.LoopingCall
+
+
+LOG = logging.getLogger(__name__)
+
+# Close reason of a crawl stopped by SITEMAP_TIME_BUDGET
+TIME_BUDGET_REASON = 'time_budget'
+# Crawls closed for these reasons write complete sitemaps
+COMPLETE_REASONS = ('finished', TIME_BUDGET_REASON)
+
+
+class Histogram(object):
+    '''Latency histogram with logarithmic buckets from 0.5 ms to 65 s.'''
+
+    BOUNDS = [0.0005 * 2 ** i for i in range(18)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        '''Add the durations of another histogram.'''
+        self.counts = [count + other_count for count, other_count
+                       in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        '''Return the upper bound of the bucket holding the percentile.'''
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+            'buckets': [[bound, count] for bound, count
+                        in zip(self.BOUNDS + [None], self.counts) if count],
+        }
+
+    def __repr__(self):
+        return '<Histogram count=%d p50=%.4f p99=%.4f max=%.4f>' % (
+            self.count, self.percentile(0.5), self.percentile(0.99),
+            self.max)
+
+
+def output_name(domain, shard=None):
+    '''Return the base name of the output files for a domain.
+
+    The process crawling shard I of N writes ``sitemap_<domain>.part-I-of-N``
+    files, so processes sharing a directory do not overwrite each other.
+    '''
+    if shard is None:
+        return 'sitemap_%s' % domain
+    return 'sitemap_%s.part-%d-of-%d' % ((domain,) + tuple(shard))
+
+
+def stage_histogram(stats, stage):
+    '''Return the histogram of a crawl stage, adding it if needed.'''
+    key = 'sitemap/timing/%s' % stage
+    histogram = stats.get_value(key)
+    if histogram is None:
+        histogram = Histogram()
+        stats.set_value(key, histogram)
+    return histogram
+
+
+def record_timing(stats, stage, seconds):
+    '''Add a duration to the histogram of a crawl stage.'''
+    stage_histogram(stats, stage).add(seconds)
+
+
+def timed(stage):
+    '''Decorator recording the duration of a method in its stats.
+
+    The instance needs a ``stats`` attribute, nothing is recorded while it
+    is None.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                if self.stats is not None:
+                    record_timing(self.stats, stage,
+                                  time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def get_peak_rss():
+    '''Return the peak resident set size of the process in bytes.'''
+    if resource is None:
+        return None
+    size = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        # on macOS ru_maxrss is in bytes, on Linux it is in KB
+        size *= 1024
+    return size
+
+
+class CrawlReport(object):
+    '''Write a JSON report about the performance of a crawl.
+
+    Download latencies and the durations of link extraction, parse_item,
+    de-duplication and export are collected as histograms. Throughput and
+    peak memory use are sampled every ``SITEMAP_REPORT_INTERVAL`` seconds.
+    At the end of the crawl everything is written to
+    ``sitemap_<domain>.report.json``. The report is written when the engine
+    stopped, after the pipelines closed the sitemap files, so the export
+    stages are complete.
+    '''
+
+    def __init__(self, stats, interval=60.0):
+        self.stats = stats
+        self.interval = interval
+        self.samples = []
+        self.task = None
+        self.start = None
+        # Output name and close reason of the closed spider
+        self.closed = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('SITEMAP_REPORT'):
+            raise exceptions.NotConfigured
+        extension = cls(crawler.stats,
+                        crawler.settings.getfloat('SITEMAP_REPORT_INTERVAL',
+                                                  60.0))
+        crawler.signals.connect(extension.spider_opened,
+                                signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed,
+                                signals.spider_closed)
+        crawler.signals.connect(extension.response_received,
+                                signals.response_received)
+        crawler.signals.connect(extension.engine_stopped,
+                                signals.engine_stopped)
+        return extension
+
+    def spider_opened(self, spider):
+        self.start = time.monotonic()
+        if self.interval:
+            self.task = create_looping_call(self.sample)
+            self.task.start(self.interval)
+
+    def response_received(self, response, request, spider):
+        latency = response.meta.get('download_latency')
+        if latency is not None:
+            record_timing(self.stats, 'download', latency)
+
+    def sample(self):
+        self.samples.append({
+            'elapsed': time.monotonic() - self.start,
+            'pages': self.stats.get_value('response_received_count', 0),
+            'bytes': self.stats.get_value('downloader/response_bytes', 0),
+            'items': self.stats.get_value('item_scraped_count', 0),
+            'peak_rss': get_peak_rss(),
+        })
+
+    def report(self, reason):
+        elapsed = time.monotonic() - self.start
+        pages = self.stats.get_value('response_received_count', 0)
+        response_bytes = self.stats.get_value('downloader/response_bytes', 0)
+        stages = {}
+        for key, value in self.stats.get_stats().items():
+            if key.startswith('sitemap/timing/'):
+                stages[key[len('sitemap/timing/'):]] = value.to_dict()
+        return {
+            'finish_reason': reason,
+            'elapsed': elapsed,
+            'pages': pages,
+            'bytes': response_bytes,
+            'items': self.stats.get_value('item_scraped_count', 0),
+            'duplicates': self.stats.get_value('sitemap/duplicates', 0),
+            'pages_per_second': pages / elapsed if elapsed else 0.0,
+            'bytes_per_second': response_bytes / elapsed if elapsed else 0.0,
+            'peak_rss': get_peak_rss(),
+            'stages': stages,
+            'samples': self.samples,
+        }
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+        self.sample()
+        self.closed = (output_name(spider.domain,
+                                   getattr(spider, 'shard', None)), reason)
+
+    def engine_stopped(self):
+        if self.closed is None:
+            return
+        name, reason = self.closed
+        path = os.path.join(os.getcwd(), name + '.report.json')
+        with open(path, 'w') as report:
+            json.dump(self.report(reason), report, indent=2, sort_keys=True)
+            report.write('\n')
+
+
+class LinkReport(object):
+    '''Report broken links, orphan pages and redirect chains of a crawl.
+
+    The spider records the links of every page in a
+    :class:`linkgraph.LinkGraph`, the status of every response is added
+    here. At the end of the crawl the broken links, the pages no other
+    page links to and the chains of redirects are written to
+    ``sitemap_<domain>.links.json``.
+    '''
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.graph = linkgraph.LinkGraph()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('SITEMAP_LINK_REPORT'):
+            raise exceptions.NotConfigured
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.spider_opened,
+                                signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed,
+                                signals.spider_closed)
+        crawler.signals.connect(extension.response_received,
+                                signals.response_received)
+        return extension
+
+    def spider_opened(self, spider):
+        spider.link_graph = self.graph
+
+    def response_received(self, response, request, spider):
+        # Responses with errors never reach the spider, their status is
+        # only seen here
+        self.graph.set_status(response.url, response.status)
+
+    def roots(self, spider):
+        '''Return the start URLs of a spider, they are never orphans.'''
+        roots = set(spider.start_urls)
+        canonicalizer = getattr(spider, 'canonicalizer', None)
+        if canonicalizer is not None:
+            roots.update(canonicalizer.canonicalize(url)
+                         for url in spider.start_urls)
+        return roots
+
+    def spider_closed(self, spider, reason):
+        report = self.graph.report(self.roots(spider))
+        self.stats.set_value('sitemap/links/broken',
+                             len(report['broken_links']))
+        self.stats.set_value('sitemap/links/orphans', len(report['orphans']))
+        name = output_name(spider.domain, getattr(spider, 'shard', None))
+        path = os.path.join(os.getcwd(), name + '.links.json')
+        with open(path, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+            output.write('\n')
+
+
+class _Window(object):
+    '''Responses of a download slot since the last adjustment.'''
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.throttled = 0
+        self.peak_active = 0
+
+
+class AdaptiveConcurrency(object):
+    '''Adjust the concurrency of the download slots to the server.
+
+    Every ``SITEMAP_CONCURRENCY_INTERVAL`` seconds the responses of every
+    download slot, one per domain, are evaluated:
+
+    * any ``429 Too Many Requests`` or more than
+      ``SITEMAP_CONCURRENCY_ERROR_RATE`` 5xx responses halve the concurrency,
+    * a 90th percentile latency above ``SITEMAP_CONCURRENCY_TARGET_LATENCY``
+      reduces it by a quarter,
+    * otherwise it grows by ``SITEMAP_CONCURRENCY_STEP`` if all requests
+      allowed were in use.
+
+    The concurrency stays between ``SITEMAP_CONCURRENCY_MIN`` and
+    ``SITEMAP_CONCURRENCY_MAX``, it starts at
+    ``CONCURRENT_REQUESTS_PER_DOMAIN``. Every change is logged.
+    '''
+
+    # Fewer responses are not evaluated, they are kept for the next round
+    MIN_RESPONSES = 20
+
+    def __init__(self, crawler, min_concurrency=4, max_concurrency=128,
+                 target_latency=1.0, error_rate=0.02, step=4, interval=5.0):
+        self.crawler = crawler
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.error_rate = error_rate
+        self.step = step
+        self.interval = interval
+        self.windows = {}
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('SITEMAP_CONCURRENCY_ADAPTIVE'):
+            raise exceptions.NotConfigured
+        if settings.getbool('AUTOTHROTTLE_ENABLED'):
+            raise exceptions.NotConfigured('AutoThrottle is enabled')
+        extension = cls(
+            crawler,
+            min_concurrency=settings.getint('SITEMAP_CONCURRENCY_MIN', 4),
+            max_concurrency=settings.getint('SITEMAP_CONCURRENCY_MAX', 128),
+            target_latency=settings.getfloat(
+                'SITEMAP_CONCURRENCY_TARGET_LATENCY', 1.0),
+            error_rate=settings.getfloat('SITEMAP_CONCURRENCY_ERROR_RATE',
+                                         0.02),
+            step=settings.getint('SITEMAP_CONCURRENCY_STEP', 4),
+            interval=settings.getfloat('SITEMAP_CONCURRENCY_INTERVAL', 5.0))
+        crawler.signals.connect(extension.spider_opened,
+                                signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed,
+                                signals.spider_closed)
+        crawler.signals.connect(extension.response_downloaded,
+                                signals.response_downloaded)
+        return extension
+
+    def spider_opened(self, spider):
+        self.task = create_looping_call(self.adjust)
+        self.task.start(self.interval, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+
+    def _slot(self, key):
+        return self.crawler.engine.downloader.slots.get(key)
+
+    def response_downloaded(self, response, request, spider):
+        # Sent before the retry middleware turns errors into new requests
+        key = request.meta.get('download_slot')
+        slot = self._slot(key)
+        latency = request.meta.get('download_latency')
+        if slot is None or latency is None:
+            return
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = _Window()
+        window.latency.add(latency)
+        if response.status == 429:
+            window.throttled += 1
+        elif response.status >= 500:
+            window.errors += 1
+        window.peak_active = max(window.peak_active, len(slot.active))
+
+    def decide(self, concurrency, window):
+        '''Return the new concurrency of a slot and the reason.'''
+        responses = window.latency.count
+        p90 = window.latency.percentile(0.9)
+        if window.throttled:
+            return concurrency // 2, '%d throttled' % window.throttled
+        if window.errors > self.error_rate * responses:
+            errors = '%d/%d errors' % (window.errors, responses)
+            return concurrency // 2, errors
+        if p90 > self.target_latency:
+            return concurrency * 3 // 4, 'p90 latency %.3fs' % p90
+        if window.peak_active >= concurrency:
+            return (concurrency + self.step,
+                    'all requests in use, p90 latency %.3fs' % p90)
+        return concurrency, None
+
+    def adjust(self):
+        stats = self.crawler.stats
+        for key, window in list(self.windows.items()):
+            slot = self._slot(key)
+            if slot is None:
+                del self.windows[key]
+                continue
+            if window.latency.count < self.MIN_RESPONSES:
+                continue
+            del self.windows[key]
+            old = slot.concurrency
+            new, reason = self.decide(old, window)
+            new = min(max(new, self.min_concurrency), self.max_concurrency)
+            if new != old:
+                slot.concurrency = new
+                LOG.info('Concurrency of %s changed from %d to %d (%s)',
+                         key, old, new, reason)
+                stats.inc_value('sitemap/concurrency/changes')
+            stats.max_value('sitemap/concurrency/max', new)
+            stats.min_value('sitemap/concurrency/min', new)
+
+
+class TimeBudget(object):
+    '''Stop a crawl after ``SITEMAP_TIME_BUDGET`` seconds.
+
+    Unlike with ``CLOSESPIDER_TIMEOUT``, the pipelines write a complete
+    sitemap with the pages found so far, which are the most important ones
+    as they are requested first. Requests waiting in the download slots
+    are dropped, only the downloads in progress are finished.
+    '''
+
+    def __init__(self, crawler, budget):
+        self.crawler = crawler
+        self.budget = budget
+        self.task = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        budget = crawler.settings.getfloat('SITEMAP_TIME_BUDGET')
+        if budget <= 0:
+            raise exceptions.NotConfigured
+        extension = cls(crawler, budget)
+        crawler.signals.connect(extension.spider_opened,
+                                signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed,
+                                signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.task = create_looping_call(self.expired)
+        self.task.start(self.budget, now=False)
+
+    def spider_closed(self, spider, reason):
+        if self.task is not None and self.task.running:
+            self.task.stop()
+
+    def expired(self):
+        self.task.stop()
+        LOG.info('Time budget of %s seconds used up, closing the crawl',
+                 self.budget)
+        self.crawler.stats.set_value('sitemap/time_budget_expired', True)
+        engine = self.crawler.engine
+        if hasattr(engine, 'close_spider_async'):
+            deferred_from_coro(
+                engine.close_spider_async(reason=TIME_BUDGET_REASON))
+        else:  # older Scrapy versions
+            engine.close_spider(self.crawler.spider, TIME_BUDGET_REASON)
+        self.drop_queued()
+
+    def drop_queued(self):
+        '''Drop the requests waiting in the download slots.
+
+        Closing the crawl only stops the scheduler. With a download delay
+        or a low concurrency per domain, up to ``CONCURRENT_REQUESTS``
+        requests wait in the download slots and would still be downloaded.
+        '''
+        dropped = 0
+        for slot in self.crawler.engine.downloader.slots.values():
+            while slot.queue:
+                request, queued = slot.queue.popleft()
+                queued.errback(failure.Failure(exceptions.IgnoreRequest(
+                    'Time budget used up')))
+                dropped += 1
+        LOG.info('Dropped %d queued requests', dropped)
+        self.crawler.stats.set_value('sitemap/time_budget/dropped_requests',
+                                     dropped)
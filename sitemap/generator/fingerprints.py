@@ -0,0 +1,120 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import hashlib
+import mmap
+import os
+
+
+def fingerprint(url):
+    '''Return a non-zero 64 bit fingerprint of a URL.'''
+    digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class FingerprintSet(object):
+    '''Compact set of URLs.
+
+    Only 64 bit fingerprints of the URLs are kept in an open addressing
+    hash table with linear probing, which needs about 16 bytes per URL
+    instead of the complete URL string. Zero marks an empty slot.
+
+    If a path is given, the table is kept in a memory mapped file instead
+    of the process memory.
+    '''
+
+    MAX_LOAD = 0.7
+
+    def __init__(self, path=None, capacity=1 << 16):
+        self.path = path
+        self.size = 0
+        self.mmap = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        if self.path is None:
+            self.buffer = bytearray(capacity * 8)
+            self.table = memoryview(self.buffer).cast('Q')
+            return
+        with open(self.path, 'w+b') as table_file:
+            table_file.truncate(capacity * 8)
+            self.mmap = mmap.mmap(table_file.fileno(), capacity * 8)
+        self.table = memoryview(self.mmap).cast('Q')
+
+    def _slot(self, value):
+        mask = len(self.table) - 1
+        index = value & mask
+        table = self.table
+        while table[index] not in (0, value):
+            index = (index + 1) & mask
+        return index
+
+    def __contains__(self, url):
+        value = fingerprint(url)
+        return self.table[self._slot(value)] == value
+
+    def __len__(self):
+        return self.size
+
+    def add(self, url):
+        value = fingerprint(url)
+        index = self._slot(value)
+        if self.table[index] == value:
+            return
+        self.table[index] = value
+        self.size += 1
+        if self.size > len(self.table) * self.MAX_LOAD:
+            self._grow()
+
+    def _grow(self):
+        old_table = self.table
+        old_mmap = self.mmap
+        old_path = self.path
+        if self.path is not None:
+            self.path = old_path + '.new'
+        self._allocate(len(old_table) * 2)
+        for value in old_table:
+            if value:
+                self.table[self._slot(value)] = value
+        old_table.release()
+        if old_mmap is not None:
+            old_mmap.close()
+            os.replace(self.path, old_path)
+            self.path = old_path
+
+    def save(self, path):
+        '''Write the fingerprints to a file.'''
+        with open(path + '.tmp', 'wb') as dump:
+            dump.write(self.size.to_bytes(8, 'little'))
+            with self.table.cast('B') as data:
+                dump.write(data)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, table_path=None):
+        '''Read fingerprints written by save.'''
+        with open(path, 'rb') as dump:
+            size = int.from_bytes(dump.read(8), 'little')
+            capacity = (os.fstat(dump.fileno()).st_size - 8) // 8
+            fingerprint_set = cls(table_path, capacity)
+            with fingerprint_set.table.cast('B') as data:
+                dump.readinto(data)
+        fingerprint_set.size = size
+        return fingerprint_set
+
+    def close(self):
+        '''Release the table and remove the file of an on-disk table.'''
+        self.table.release()
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+            os.remove(self.path)
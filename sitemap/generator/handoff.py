@@ -0,0 +1,128 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+
+from . import fingerprints
+
+
+class LinkHandoff(object):
+    '''Pass links to the process of a sharded crawl which owns them.
+
+    Every process of a crawl started with ``shard=I/N`` appends the links
+    it finds for shard J to ``links-J-from-I.txt`` in a directory shared by
+    all processes, and reads the files addressed to its own shard. Every
+    file has a single writer and is only appended to.
+
+    Every process records in ``status-I.json`` whether it is idle and how
+    far it has read the files addressed to it. The crawl is done when all
+    processes are idle and have read all links sent to them, only then can
+    no process find new pages any more.
+
+    Links are sent once. With ``sources`` set, every link is sent with the
+    page it was found on, once per page, for the link report.
+    '''
+
+    def __init__(self, path, shard, sources=False):
+        self.path = path
+        self.index, self.count = shard
+        self.sources = sources
+        self.outputs = {}
+        self.sent = fingerprints.FingerprintSet()
+        os.makedirs(path, exist_ok=True)
+        # Bytes read of the files sent to this shard, by sending shard.
+        # A resumed crawl continues where it stopped.
+        self.consumed = dict.fromkeys(range(1, self.count + 1), 0)
+        status = self._read_status(self.index)
+        if status is not None:
+            for source, offset in status['consumed'].items():
+                self.consumed[int(source)] = offset
+        self.write_status(idle=False)
+
+    def _links_path(self, target, source):
+        return os.path.join(self.path,
+                            'links-%d-from-%d.txt' % (target, source))
+
+    def _status_path(self, index):
+        return os.path.join(self.path, 'status-%d.json' % index)
+
+    def _read_status(self, index):
+        try:
+            with open(self._status_path(index)) as status:
+                return json.load(status)
+        except (OSError, ValueError):
+            return None
+
+    def send(self, target, url, source=''):
+        '''Send a link found on the page source to shard target.'''
+        if not self.sources:
+            source = ''
+        key = '%s\t%s' % (url, source)
+        if key in self.sent:
+            return
+        self.sent.add(key)
+        output = self.outputs.get(target)
+        if output is None:
+            output = self.outputs[target] = open(
+                self._links_path(target, self.index), 'a')
+        output.write(key + '\n')
+
+    def receive(self):
+        '''Return the new links sent to this shard as (url, source).'''
+        received = []
+        for source in range(1, self.count + 1):
+            path = self._links_path(self.index, source)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as links:
+                links.seek(self.consumed[source])
+                data = links.read()
+            # The last line may still be written
+            end = data.rfind(b'\n') + 1
+            self.consumed[source] += end
+            for line in data[:end].decode('utf-8').splitlines():
+                url, _, page = line.partition('\t')
+                received.append((url, page))
+        if received:
+            self.write_status(idle=False)
+        return received
+
+    def write_status(self, idle):
+        # Links sent have to be visible before the status
+        for output in self.outputs.values():
+            output.flush()
+        path = self._status_path(self.index)
+        with open(path + '.tmp', 'w') as status:
+            json.dump({'idle': idle, 'consumed': self.consumed}, status)
+        os.replace(path + '.tmp', path)
+
+    def finished(self):
+        '''Record this shard as idle and check if all shards are done.'''
+        self.write_status(idle=True)
+        for index in range(1, self.count + 1):
+            status = self._read_status(index)
+            if status is None or not status['idle']:
+                return False
+            for source in range(1, self.count + 1):
+                path = self._links_path(index, source)
+                if not os.path.exists(path):
+                    continue
+                consumed = status['consumed'].get(str(source), 0)
+                if os.path.getsize(path) > consumed:
+                    return False
+        return True
+
+    def close(self):
+        for output in self.outputs.values():
+            output.close()
+        self.outputs = {}
@@ -0,0 +1,121 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+import sqlite3
+import time
+import zlib
+
+from scrapy.downloadermiddlewares import httpcache
+from scrapy import exceptions
+from scrapy.extensions import httpcache as httpcache_policies
+from scrapy import http
+from scrapy import responsetypes
+from w3lib import http as w3lib_http
+
+LOG = logging.getLogger(__name__)
+
+
+class ResponseStore(object):
+    '''HTTP cache storage keeping all responses in one SQLite database.
+
+    Responses are stored by the fingerprint of their request, with the raw
+    headers and the zlib compressed body. Without bodies only the status
+    and headers are kept, which is enough to replay HEAD requests and
+    pages requested directly, for example from a seed sitemap.
+
+    In record mode cached responses are never returned, so every request
+    is sent to the server and its response replaces the stored one. In
+    replay mode nothing is stored.
+    '''
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, path, record=False, bodies=True):
+        self.path = path
+        self.record = record
+        self.bodies = bodies
+        self.connection = None
+        self.fingerprinter = None
+        self.pending = 0
+
+    def open_spider(self, spider):
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'fingerprint BLOB PRIMARY KEY, url TEXT, status INTEGER, '
+            'headers BLOB, body BLOB, time REAL)')
+        self.connection.commit()
+        self.fingerprinter = spider.crawler.request_fingerprinter
+        LOG.info('%s responses in %s', 'Recording' if self.record
+                 else 'Replaying', self.path)
+
+    def close_spider(self, spider):
+        self.connection.commit()
+        self.connection.close()
+
+    def retrieve_response(self, spider, request):
+        if self.record:
+            return None
+        row = self.connection.execute(
+            'SELECT url, status, headers, body, time FROM responses '
+            'WHERE fingerprint = ?',
+            (self.fingerprinter.fingerprint(request),)).fetchone()
+        if row is None:
+            return None
+        url, status, raw_headers, body, timestamp = row
+        headers = http.Headers(w3lib_http.headers_raw_to_dict(raw_headers))
+        body = zlib.decompress(body) if body else b''
+        request.meta['cache_timestamp'] = timestamp
+        cls = responsetypes.responsetypes.from_args(headers=headers,
+                                                    url=url, body=body)
+        return cls(url=url, status=status, headers=headers, body=body)
+
+    def store_response(self, spider, request, response):
+        if not self.record:
+            return
+        body = None
+        if self.bodies and response.body:
+            body = zlib.compress(response.body)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+            (self.fingerprinter.fingerprint(request), response.url,
+             response.status, response.headers.to_string(), body,
+             time.time()))
+        self.pending += 1
+        if self.pending >= self.BATCH_SIZE:
+            self.connection.commit()
+            self.pending = 0
+
+
+class RecordReplayMiddleware(httpcache.HttpCacheMiddleware):
+    '''Record the responses of a crawl and replay them without network.
+
+    With ``SITEMAP_RECORD=FILE`` all responses are stored in FILE, with
+    ``SITEMAP_REPLAY=FILE`` responses are only taken from FILE and requests
+    which were not recorded are ignored.
+    '''
+
+    def __init__(self, settings, stats):
+        record = settings.get('SITEMAP_RECORD')
+        replay = settings.get('SITEMAP_REPLAY')
+        if record and replay:
+            raise ValueError('SITEMAP_RECORD and SITEMAP_REPLAY can not be '
+                             'used together')
+        if not record and not replay:
+            raise exceptions.NotConfigured
+        self.policy = httpcache_policies.DummyPolicy(settings)
+        self.storage = ResponseStore(
+            record or replay, record=bool(record),
+            bodies=settings.getbool('SITEMAP_RECORD_BODIES', True))
+        self.ignore_missing = bool(replay)
+        self.stats = stats
@@ -0,0 +1,136 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import array
+
+# Redirect target of URLs which are not redirected
+NO_REDIRECT = -1
+
+
+class LinkGraph(object):
+    '''Links between the pages of a crawl and the status of every page.
+
+    URLs are interned as integer ids. The links are kept as two arrays of
+    source and target ids, the HTTP status and the redirect target of
+    every URL in arrays indexed by its id. Besides the interned URL
+    strings the arrays need 6 bytes per URL and 8 bytes per link. A status
+    of 0 marks URLs which were not downloaded.
+    '''
+
+    def __init__(self):
+        self.ids = {}
+        self.urls = []
+        self.status = array.array('H')
+        self.redirects = array.array('i')
+        self.sources = array.array('I')
+        self.targets = array.array('I')
+
+    def __len__(self):
+        return len(self.urls)
+
+    def url_id(self, url):
+        '''Return the id of a URL, adding it to the graph if needed.'''
+        url_id = self.ids.get(url)
+        if url_id is None:
+            url_id = self.ids[url] = len(self.urls)
+            self.urls.append(url)
+            self.status.append(0)
+            self.redirects.append(NO_REDIRECT)
+        return url_id
+
+    def add_links(self, source, targets):
+        '''Add the links of a page, every target is added once.'''
+        source_id = self.url_id(source)
+        target_ids = dict.fromkeys(self.url_id(url) for url in targets)
+        for target_id in target_ids:
+            self.sources.append(source_id)
+            self.targets.append(target_id)
+
+    def set_status(self, url, status):
+        self.status[self.url_id(url)] = status
+
+    def add_redirect(self, source, target, status):
+        source_id = self.url_id(source)
+        self.status[source_id] = status
+        self.redirects[source_id] = self.url_id(target)
+
+    def chain(self, url_id):
+        '''Return the ids of a URL and the URLs it redirects to.'''
+        chain = [url_id]
+        seen = {url_id}
+        target = self.redirects[url_id]
+        while target != NO_REDIRECT and target not in seen:
+            chain.append(target)
+            seen.add(target)
+            target = self.redirects[target]
+        return chain
+
+    def broken_links(self):
+        '''Yield source, target and status of links to failing pages.
+
+        Redirects are followed, the status is the one of the final page.
+        '''
+        status = self.status
+        for source_id, target_id in zip(self.sources, self.targets):
+            final_status = status[self.chain(target_id)[-1]]
+            if final_status >= 400:
+                yield (self.urls[source_id], self.urls[target_id],
+                       final_status)
+
+    def orphans(self, roots=()):
+        '''Yield the pages no other page links to.
+
+        Pages reached through redirects count as linked, as do the roots
+        of the crawl and the pages they redirect to.
+        '''
+        linked = bytearray(len(self.urls))
+        for target_id in self.targets:
+            linked[target_id] = 1
+        for url in roots:
+            if url in self.ids:
+                linked[self.ids[url]] = 1
+        for url_id, target_id in enumerate(self.redirects):
+            if target_id != NO_REDIRECT and linked[url_id]:
+                for chained_id in self.chain(url_id):
+                    linked[chained_id] = 1
+        for url_id, status in enumerate(self.status):
+            # Pages answered with 304 are unchanged, but still there
+            if linked[url_id] or not (200 <= status < 300 or status == 304):
+                continue
+            yield self.urls[url_id]
+
+    def redirect_chains(self):
+        '''Yield the URLs of every chain of redirects and its final status.
+
+        Chains start at URLs which are not the target of a redirect.
+        '''
+        targets = set(self.redirects)
+        for url_id, target_id in enumerate(self.redirects):
+            if target_id == NO_REDIRECT or url_id in targets:
+                continue
+            chain = self.chain(url_id)
+            yield ([self.urls[chained_id] for chained_id in chain],
+                   self.status[chain[-1]])
+
+    def report(self, roots=()):
+        '''Return the broken links, orphans and redirect chains.'''
+        return {
+            'urls': len(self.urls),
+            'links': len(self.sources),
+            'broken_links': [
+                {'source': source, 'target': target, 'status': status}
+                for source, target, status in sorted(self.broken_links())],
+            'orphans': sorted(self.orphans(roots)),
+            'redirect_chains': [
+                {'chain': chain, 'status': status}
+                for chain, status in sorted(self.redirect_chains())],
+        }
@@ -0,0 +1,89 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import re
+import urllib.parse as urlparse
+
+from lxml import etree
+from scrapy import link
+from w3lib import url as w3lib_url
+
+
+# Characters which need no escaping in a URL
+SAFE_URL_PAT = re.compile(r"^[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=%]*$")
+HTML5_WHITESPACE = ' \t\n\r\x0c'
+# Schemes followed by the Scrapy LinkExtractor, mailto: and the like are
+# dropped
+VALID_SCHEMES = frozenset(['http', 'https', 'file', 'ftp'])
+
+
+class _HrefTarget(object):
+    '''lxml parser target collecting link targets without building a tree.'''
+
+    TAGS = frozenset(['a', 'area'])
+
+    def __init__(self):
+        self.hrefs = []
+        self.base = None
+
+    def start(self, tag, attrib):
+        if tag in self.TAGS:
+            href = attrib.get('href')
+            if href is not None:
+                self.hrefs.append(href)
+        elif tag == 'base' and self.base is None:
+            self.base = attrib.get('href')
+
+    def close(self):
+        return self.hrefs
+
+
+class HrefLinkExtractor(object):
+    '''Extract the href attributes of a and area elements.
+
+    The document is parsed with an event based lxml parser, no element
+    tree is built. Links are made absolute and de-duplicated like the
+    Scrapy LinkExtractor does, filtering is left to the process_links
+    callback of the rule.
+    '''
+
+    def extract_links(self, response):
+        if not response.body:
+            return []
+        target = _HrefTarget()
+        parser = etree.HTMLParser(target=target, encoding=response.encoding)
+        parser.feed(response.body)
+        hrefs = parser.close()
+
+        base_url = response.url
+        if target.base:
+            base_url = urlparse.urljoin(base_url,
+                                        target.base.strip(HTML5_WHITESPACE))
+        links = []
+        seen = set()
+        for href in hrefs:
+            try:
+                url = urlparse.urljoin(base_url,
+                                       href.strip(HTML5_WHITESPACE))
+            except ValueError:
+                continue
+            if url.partition(':')[0].lower() not in VALID_SCHEMES:
+                continue
+            if not SAFE_URL_PAT.match(url):
+                try:
+                    url = w3lib_url.safe_url_string(url, response.encoding)
+                except ValueError:
+                    continue
+            if url not in seen:
+                seen.add(url)
+                links.append(link.Link(url))
+        return links
@@ -0,0 +1,66 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import time
+import urllib.parse as urlparse
+
+from . import canonical
+from .spiders import sitemap_file
+
+# Directories of Sphinx builds with sources and static files, which are
+# only part of a crawl if a page links to them
+BUILD_DIRS = ('_images', '_sources', '_static')
+
+# Files which are part of the sitemap, like the allow list of the crawl
+EXTENSIONS = ('.html', '.pdf', '.xml', '.txt')
+
+
+def walk_tree(root, spider):
+    '''Generate sitemap items for all files below root.
+
+    Files with one of the EXTENSIONS are mapped to canonical URLs on
+    ``spider.domain`` and filtered with the URL classifier of the spider,
+    the lastmod value is taken from the modification time of the file.
+    Hidden files and directories and the directories in BUILD_DIRS are
+    skipped.
+    '''
+    # Only index files are mapped to their directory, a file is never
+    # a directory
+    canonicalizer = canonical.UrlCanonicalizer(
+        index_files=spider.canonicalizer.index_files,
+        strip_query=spider.canonicalizer.strip_query,
+        trailing_slash=False)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames
+                             if name[0] != '.' and name not in BUILD_DIRS)
+        relpath = os.path.relpath(dirpath, root)
+        if relpath == os.curdir:
+            prefix = '/'
+        else:
+            prefix = '/' + '/'.join(relpath.split(os.sep)) + '/'
+        for filename in sorted(filenames):
+            if filename.startswith('.') or not filename.endswith(EXTENSIONS):
+                continue
+            path = urlparse.quote(prefix + filename)
+            url = canonicalizer.canonicalize(
+                'https://%s%s' % (spider.domain, path))
+            classification = spider.url_classifier.classify(url)
+            if classification is None:
+                continue
+            mtime = os.stat(os.path.join(dirpath, filename)).st_mtime
+            item = sitemap_file.SitemapItem()
+            item['loc'] = url
+            item['lastmod'] = time.strftime('%Y-%m-%dT%H:%M:%S+00:00',
+                                            time.gmtime(mtime))
+            item['priority'], item['changefreq'] = classification
+            yield item
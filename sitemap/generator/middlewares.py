@@ -0,0 +1,44 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import logging
+
+from scrapy.downloadermiddlewares import redirect
+from scrapy import exceptions
+
+LOG = logging.getLogger(__name__)
+
+
+class SitemapRedirectMiddleware(redirect.RedirectMiddleware):
+    '''Check redirects before they are followed.
+
+    docs.openstack.org redirects to a few sites which are not part of the
+    sitemap. Redirects to URLs the spider does not crawl are dropped
+    instead of downloading their target, all others are followed. Every
+    redirect is passed to the spider, which keeps it for later crawls.
+    '''
+
+    def process_response(self, request, response, spider=None):
+        result = super(SitemapRedirectMiddleware, self).process_response(
+            request, response)
+        if result is response:
+            return result
+        spider = self.crawler.spider
+        spider.redirect_found(request.url, result.url, response.status)
+        if not spider.follows_url(result.url):
+            self.crawler.stats.inc_value('sitemap/redirects/offsite')
+            self.crawler.stats.inc_value('sitemap/redirects/saved_requests')
+            LOG.debug('Ignoring redirect from %s to %s', request.url,
+                      result.url)
+            raise exceptions.IgnoreRequest(
+                'Redirect to %s is not followed' % result.url)
+        return result
@@ -10,82 +10,550 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+import gzip
+import io
+import json
+import logging
 import os
+import queue
+import threading
+import time
+import urllib.parse as urlparse
+from xml.sax import saxutils
 
-import lxml
 import scrapy
 from scrapy import exporters
+from twisted.internet import defer
+
+from . import extensions
+from . import fingerprints
+
+LOG = logging.getLogger(__name__)
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+# Upper bound of the size of a single serialized <url> entry, URLs are
+# limited to 2048 characters by the sitemap protocol.
+MAX_ENTRY_SIZE = 4096
 
 
 class SitemapItemExporter(exporters.XmlItemExporter):
-    '''XmlItemExporer with adjusted attributes for the root element.'''
+    '''XmlItemExporer with adjusted attributes for the root element.
+
+    Items are indented as they are written, so the output needs no
+    pretty-printing afterwards.
+    '''
+
+    def __init__(self, file, **kwargs):
+        kwargs.setdefault('indent', 2)
+        super(SitemapItemExporter, self).__init__(file, **kwargs)
 
     def start_exporting(self):
         '''Set namespace / schema attributes for the root element.'''
         self.xg.startDocument()
         self.xg.startElement(self.root_element, {
-            "xmlns": "http://www.sitemaps.org/schemas/sitemap/0.9",
+            "xmlns": SITEMAP_NS,
             "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
             "xsi:schemaLocation":
             "http://www.sitemaps.org/schemas/sitemap/0.9 "
             "http://www.sitemaps.org/schemas/sitemap/0.9/sitemap.xsd"
         })
+        self._beautify_newline(new_item=True)
+
+
+class ShardFile(io.RawIOBase):
+    '''Output file of a sitemap shard.
+
+    Written data is optionally gzip compressed. A checkpoint ends the
+    current gzip member, so the file can be truncated to the length
+    returned by checkpoint and appended to by a later crawl.
+    '''
+
+    def __init__(self, path, compresslevel=None, offset=None, size=0):
+        super(ShardFile, self).__init__()
+        if offset is None:
+            self.raw = open(path, 'wb')
+        else:
+            self.raw = open(path, 'r+b')
+            self.raw.truncate(offset)
+            self.raw.seek(offset)
+        self.compresslevel = compresslevel
+        self.member = None
+        self.size = size
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.compresslevel is None:
+            self.raw.write(data)
+        else:
+            if self.member is None:
+                self.member = gzip.GzipFile(fileobj=self.raw, mode='wb',
+                                            compresslevel=self.compresslevel)
+            self.member.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self):
+        '''Return the number of uncompressed bytes written.'''
+        return self.size
+
+    def checkpoint(self):
+        '''Flush all data to disk and return the length of the file.'''
+        if self.member is not None:
+            self.member.close()
+            self.member = None
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        return self.raw.tell()
+
+    def close(self):
+        if not self.closed:
+            if self.member is not None:
+                self.member.close()
+            self.raw.close()
+        super(ShardFile, self).close()
+
+
+def job_path(jobdir, name):
+    if not jobdir:
+        return None
+    return os.path.join(jobdir, name)
+
+
+def item_domain(item):
+    '''Return the domain an item belongs to.'''
+    return urlparse.urlsplit(item['loc']).netloc
 
 
 class IgnoreDuplicateUrls(object):
-    '''Ignore duplicated URLs.'''
+    '''Ignore duplicated URLs.
 
-    def __init__(self):
-        self.processed = set()
+    Processed URLs are kept as fingerprints, separately for every domain.
+    With ``SITEMAP_DEDUP_FILE`` set the fingerprints are kept in memory
+    mapped files named ``<SITEMAP_DEDUP_FILE>.<domain>``. If a crawl with a
+    ``JOBDIR`` is interrupted, the fingerprints are saved in the job
+    directory and loaded again when the crawl is resumed.
+    '''
+
+    CHECKPOINT_PREFIX = 'sitemap-dedup-'
+
+    def __init__(self, path=None, jobdir=None):
+        self.path = path
+        self.processed = {}
+        self.jobdir = jobdir
+        self.stats = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(crawler.settings.get('SITEMAP_DEDUP_FILE'),
+                       crawler.settings.get('JOBDIR'))
+        pipeline.stats = crawler.stats
+        crawler.signals.connect(pipeline.spider_opened,
+                                scrapy.signals.spider_opened)
+        crawler.signals.connect(pipeline.spider_closed,
+                                scrapy.signals.spider_closed)
+        return pipeline
 
+    def _table_path(self, domain):
+        if not self.path:
+            return None
+        return '%s.%s' % (self.path, domain)
+
+    def _checkpoint(self, domain):
+        return job_path(self.jobdir, self.CHECKPOINT_PREFIX + domain)
+
+    def fingerprints(self, domain):
+        '''Return the fingerprints of the processed URLs of a domain.'''
+        if domain not in self.processed:
+            self.processed[domain] = fingerprints.FingerprintSet(
+                self._table_path(domain))
+        return self.processed[domain]
+
+    def spider_opened(self, spider):
+        if not self.jobdir or not os.path.isdir(self.jobdir):
+            return
+        for name in os.listdir(self.jobdir):
+            if name.startswith(self.CHECKPOINT_PREFIX):
+                domain = name[len(self.CHECKPOINT_PREFIX):]
+                self.processed[domain] = fingerprints.FingerprintSet.load(
+                    os.path.join(self.jobdir, name),
+                    self._table_path(domain))
+
+    def spider_closed(self, spider, reason='finished'):
+        for domain, processed in self.processed.items():
+            if self.jobdir:
+                checkpoint = self._checkpoint(domain)
+                if reason not in extensions.COMPLETE_REASONS:
+                    os.makedirs(self.jobdir, exist_ok=True)
+                    processed.save(checkpoint)
+                elif os.path.exists(checkpoint):
+                    os.remove(checkpoint)
+            processed.close()
+        self.processed = {}
+
+    @extensions.timed('dedup')
     def process_item(self, item, spider):
         '''Check if a URL was already found.'''
-        if item['loc'] in self.processed:
+        processed = self.fingerprints(item_domain(item))
+        if item['loc'] in processed:
+            if self.stats is not None:
+                self.stats.inc_value('sitemap/duplicates')
             raise scrapy.exceptions.DropItem("Duplicate URL found: %s."
                                              % item['loc'])
         else:
-            self.processed.add(item['loc'])
+            processed.add(item['loc'])
             return item
 
 
+class DomainSitemap(object):
+    '''Sitemap files of a single domain.
+
+    The output is split into shards named ``<name>-NNNN.xml`` whenever a
+    shard reaches ``max_urls`` URLs or ``max_bytes`` bytes, the name
+    defaults to ``sitemap_<domain>``.
+    '''
+
+    def __init__(self, domain, max_urls=50000, max_bytes=52428800,
+                 suffix='.xml', compresslevel=None, name=None):
+        self.domain = domain
+        self.name = name or 'sitemap_%s' % domain
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.compresslevel = compresslevel
+        self.file = None
+        self.exporter = None
+        self.shards = []
+        self.count = 0
+
+    def _shard_path(self, number):
+        return os.path.join(os.getcwd(), '%s-%04d%s'
+                            % (self.name, number, self.suffix))
+
+    def open_shard(self, offset=None, size=0):
+        if offset is None:
+            self.shards.append((self._shard_path(len(self.shards) + 1),
+                                None))
+        self.file = ShardFile(self.shards[-1][0], self.compresslevel,
+                              offset, size)
+        self.exporter = SitemapItemExporter(self.file, item_element='url',
+                                            root_element='urlset')
+        if offset is None:
+            self.exporter.start_exporting()
+            self.count = 0
+
+    def close_shard(self):
+        self.exporter.finish_exporting()
+        self.file.close()
+        self.file = None
+        lastmod = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime())
+        self.shards[-1] = (self.shards[-1][0], lastmod)
+
+    def export_item(self, item):
+        full = self.file.tell() + MAX_ENTRY_SIZE > self.max_bytes
+        if full or self.count >= self.max_urls:
+            self.close_shard()
+            self.open_shard()
+        self.exporter.export_item(item)
+        self.count += 1
+
+    def save(self):
+        '''Flush the current shard and return the state to resume from.'''
+        return {
+            'shards': self.shards,
+            'offset': self.file.checkpoint(),
+            'size': self.file.tell(),
+            'count': self.count,
+        }
+
+    def restore(self, checkpoint):
+        self.shards = [tuple(shard) for shard in checkpoint['shards']]
+        self.open_shard(checkpoint['offset'], checkpoint['size'])
+        self.count = checkpoint['count']
+
+    def suspend(self):
+        '''Keep the partial shard a valid sitemap after save.
+
+        The closing tag is written after the saved offset and removed on
+        resume.
+        '''
+        self.exporter.finish_exporting()
+        self.file.close()
+        self.file = None
+
+    def finish(self, base_url=None):
+        '''Close the last shard and write the index if needed.
+
+        If all URLs fit into a single shard, it is renamed to
+        ``<name>.xml`` and no index is written.
+        '''
+        self.close_shard()
+        if len(self.shards) == 1:
+            os.replace(self.shards[0][0],
+                       os.path.join(os.getcwd(), '%s%s'
+                                    % (self.name, self.suffix)))
+        else:
+            self.write_index(base_url)
+
+    def write_index(self, base_url=None):
+        base_url = base_url or 'https://%s/' % self.domain
+        with open(os.path.join(os.getcwd(), '%s-index.xml' % self.name),
+                  'w') as index:
+            index.write('<?xml version="1.0" encoding="utf-8"?>\n')
+            index.write('<sitemapindex xmlns="%s">\n' % SITEMAP_NS)
+            for path, lastmod in self.shards:
+                loc = base_url.rstrip('/') + '/' + os.path.basename(path)
+                index.write('  <sitemap>\n')
+                index.write('    <loc>%s</loc>\n' % saxutils.escape(loc))
+                index.write('    <lastmod>%s</lastmod>\n' % lastmod)
+                index.write('  </sitemap>\n')
+            index.write('</sitemapindex>\n')
+
+
+class BackgroundWriter(object):
+    '''Write items in batches on a worker thread.
+
+    Items are passed to the worker through a bounded queue. While the
+    queue is full, put returns a Deferred which fires once the item is
+    queued, so the crawl waits for the writer without blocking the
+    reactor. Items are written in the order they were put.
+
+    The durations of the writes are kept by the worker and added to the
+    ``export_write`` stage of the stats in close, as the stats are not
+    thread-safe.
+    '''
+
+    STOP = object()
+
+    def __init__(self, write, queue_size=1000, batch_size=100, stats=None):
+        self.write = write
+        self.queue = queue.Queue(queue_size)
+        self.batch_size = batch_size
+        self.stats = stats
+        # Items which did not fit into the queue, with their Deferreds
+        self.waiting = collections.deque()
+        self.error = None
+        self.timing = extensions.Histogram()
+        # Installed by the crawler, it must not be imported earlier
+        from twisted.internet import reactor
+        self.reactor = reactor
+        self.thread = threading.Thread(target=self._run,
+                                       name='sitemap-writer', daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        '''Queue an item, returns the item or a Deferred firing with it.'''
+        if self.error is not None:
+            raise self.error
+        if not self.waiting:
+            try:
+                self.queue.put_nowait(item)
+                return item
+            except queue.Full:
+                pass
+        if self.stats is not None:
+            self.stats.inc_value('sitemap/export/queue_full')
+        waiting = defer.Deferred()
+        self.waiting.append((item, waiting))
+        return waiting
+
+    def _release(self):
+        '''Move waiting items to the queue, runs in the reactor thread.'''
+        while self.waiting:
+            item, waiting = self.waiting[0]
+            if self.error is not None:
+                self.waiting.popleft()
+                waiting.errback(self.error)
+                continue
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                return
+            self.waiting.popleft()
+            waiting.callback(item)
+
+    def _run(self):
+        done = False
+        while not done:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch[-1] is self.STOP:
+                batch.pop()
+                done = True
+            if batch and self.error is None:
+                start = time.perf_counter()
+                try:
+                    self.write(batch)
+                except Exception as error:
+                    LOG.exception('Writing the sitemap failed')
+                    self.error = error
+                self.timing.add(time.perf_counter() - start)
+            if not done:
+                self.reactor.callFromThread(self._release)
+
+    def close(self):
+        '''Write all remaining items and stop the worker thread.'''
+        while self.waiting:
+            item, waiting = self.waiting.popleft()
+            self.queue.put(item)
+            waiting.callback(item)
+        self.queue.put(self.STOP)
+        self.thread.join()
+        if self.stats is not None and self.timing.count:
+            extensions.stage_histogram(self.stats,
+                                       'export_write').merge(self.timing)
+        if self.error is not None:
+            raise self.error
+
+
 class ExportSitemap(object):
-    '''Write found URLs to a sitemap file.
+    '''Write found URLs to a sitemap file per domain.
 
     Based on http://doc.scrapy.org/en/latest/topics/exporters.html.
+
+    Every domain of the spider gets its own sitemap files, see
+    DomainSitemap. Every shard is complete as soon as it is closed and a
+    ``sitemap_<domain>-index.xml`` file listing all shards of a domain is
+    written at the end of the crawl if the domain needed more than one.
+
+    If a crawl with a ``JOBDIR`` is interrupted, the current shards are
+    completed and the position of the last item of every domain is saved
+    in the job directory. A resumed crawl truncates the shards to that
+    position and continues writing them.
+
+    With ``SITEMAP_COMPRESS`` enabled all sitemap files are gzip compressed
+    while they are written and get an additional ``.gz`` suffix. The size
+    limit always applies to the uncompressed data.
+
+    A spider crawling shard i of N writes partial sitemaps named
+    ``sitemap_<domain>.part-i-of-N.xml``, which are combined by the
+    ``scrapy merge`` command.
+
+    During a crawl the items are serialized and written by a
+    BackgroundWriter, so slow disks do not stall the downloads, unless
+    ``SITEMAP_EXPORT_THREAD`` is disabled.
     '''
 
-    def __init__(self):
-        self.files = {}
-        self.exporter = None
+    def __init__(self, max_urls=50000, max_bytes=52428800, base_url=None,
+                 compress=False, compresslevel=9, jobdir=None,
+                 queue_size=0):
+        self.sitemaps = {}
+        # Shard of a distributed crawl, its output files are partial
+        self.shard = None
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.base_url = base_url
+        self.compress = compress
+        self.compresslevel = compresslevel
+        self.suffix = '.xml.gz' if compress else '.xml'
+        self.checkpoint = job_path(jobdir, 'sitemap-export.json')
+        # Items are written by a BackgroundWriter if the queue size is set
+        self.queue_size = queue_size
+        self.writer = None
+        self.stats = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(max_urls=settings.getint('SITEMAP_MAX_URLS', 50000),
+                   max_bytes=settings.getint('SITEMAP_MAX_BYTES', 52428800),
+                   base_url=settings.get('SITEMAP_BASE_URL'),
+                   compress=settings.getbool('SITEMAP_COMPRESS'),
+                   compresslevel=settings.getint('SITEMAP_COMPRESSLEVEL', 9),
+                   jobdir=settings.get('JOBDIR'))
 
     @classmethod
     def from_crawler(cls, crawler):
-        pipeline = cls()
+        pipeline = cls.from_settings(crawler.settings)
+        pipeline.stats = crawler.stats
+        if crawler.settings.getbool('SITEMAP_EXPORT_THREAD', True):
+            pipeline.queue_size = crawler.settings.getint(
+                'SITEMAP_EXPORT_QUEUE_SIZE', 1000)
         crawler.signals.connect(pipeline.spider_opened,
                                 scrapy.signals.spider_opened)
         crawler.signals.connect(pipeline.spider_closed,
                                 scrapy.signals.spider_closed)
         return pipeline
 
+    def _new_sitemap(self, domain):
+        sitemap = DomainSitemap(
+            domain, self.max_urls, self.max_bytes, self.suffix,
+            self.compresslevel if self.compress else None,
+            extensions.output_name(domain, self.shard))
+        self.sitemaps[domain] = sitemap
+        return sitemap
+
     def spider_opened(self, spider):
-        output = open(os.path.join(os.getcwd(), 'sitemap_%s.xml'
-                                   % spider.domain), 'w')
-        self.files[spider] = output
-        self.exporter = SitemapItemExporter(output, item_element='url',
-                                            root_element='urlset')
-        self.exporter.start_exporting()
+        self.sitemaps = {}
+        self.shard = getattr(spider, 'shard', None)
+        checkpoint = {}
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        for domain, state in checkpoint.items():
+            self._new_sitemap(domain).restore(state)
+        # Every domain of the spider gets a sitemap, even an empty one
+        for domain in getattr(spider, 'domains', [spider.domain]):
+            if domain not in self.sitemaps:
+                self._new_sitemap(domain).open_shard()
+        if self.queue_size:
+            self.writer = BackgroundWriter(self._write_batch,
+                                           self.queue_size, stats=self.stats)
 
-    def spider_closed(self, spider):
-        self.exporter.finish_exporting()
-        output = self.files.pop(spider)
-        output.close()
-        tree = lxml.etree.parse(os.path.join(os.getcwd(), "sitemap_%s.xml"
-                                             % spider.domain))
-        with open(os.path.join(os.getcwd(), "sitemap_%s.xml" % spider.domain),
-                  'w') as pretty:
-            pretty.write(lxml.etree.tostring(tree, pretty_print=True,
-                                             encoding='unicode'))
+    def _save_checkpoint(self):
+        checkpoint = dict((domain, sitemap.save())
+                          for domain, sitemap in self.sitemaps.items())
+        os.makedirs(os.path.dirname(self.checkpoint), exist_ok=True)
+        with open(self.checkpoint + '.tmp', 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(self.checkpoint + '.tmp', self.checkpoint)
 
+    def spider_closed(self, spider, reason='finished'):
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.close()
+        if self.checkpoint and reason not in extensions.COMPLETE_REASONS:
+            self._save_checkpoint()
+            for sitemap in self.sitemaps.values():
+                sitemap.suspend()
+            return
+        start = time.perf_counter()
+        for sitemap in self.sitemaps.values():
+            sitemap.finish(self.base_url)
+        if self.stats is not None:
+            extensions.record_timing(self.stats, 'export_close',
+                                     time.perf_counter() - start)
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    @extensions.timed('export')
     def process_item(self, item, spider):
-        self.exporter.export_item(item)
+        if self.writer is not None:
+            return self.writer.put(item)
+        self._write(item)
         return item
+
+    def _write(self, item):
+        domain = item_domain(item)
+        sitemap = self.sitemaps.get(domain)
+        if sitemap is None:
+            sitemap = self._new_sitemap(domain)
+            sitemap.open_shard()
+        sitemap.export_item(item)
+
+    def _write_batch(self, items):
+        for item in items:
+            self._write(item)
+
+    def export(self, spider, items):
+        '''Write all items outside of a crawl, as done by the commands.'''
+        self.spider_opened(spider)
+        for item in items:
+            self.process_item(item, spider)
+        self.spider_closed(spider)
@@ -13,15 +13,32 @@
 # Configuration variables used inside Scrapy to enable modules/pipelines
 # and to affect the behavior of several parts.
 
-from scrapy import linkextractors
-
 BOT_NAME = 'sitemap'
 SPIDER_MODULES = ['generator.spiders']
+COMMANDS_MODULE = 'generator.commands'
+EXTENSIONS = {
+    'generator.extensions.CrawlReport': 500,
+    'generator.extensions.AdaptiveConcurrency': 510,
+    'generator.extensions.TimeBudget': 520,
+    'generator.extensions.LinkReport': 530,
+}
+# Redirects are checked against the crawled domains before they are
+# followed, responses can be recorded and replayed with SITEMAP_RECORD and
+# SITEMAP_REPLAY
+DOWNLOADER_MIDDLEWARES = {
+    'scrapy.downloadermiddlewares.redirect.RedirectMiddleware': None,
+    'generator.middlewares.SitemapRedirectMiddleware': 600,
+    'generator.httpcache.RecordReplayMiddleware': 900,
+}
+# Pipelines with lower values run first, duplicates have to be dropped
+# before they are exported
 ITEM_PIPELINES = {
-    'generator.pipelines.IgnoreDuplicateUrls': 500,
-    'generator.pipelines.ExportSitemap': 100,
+    'generator.pipelines.IgnoreDuplicateUrls': 100,
+    'generator.pipelines.ExportSitemap': 500,
 }
-CONCURRENT_REQUESTS = 32
+# The per domain concurrency is the starting point of the adaptive
+# concurrency, the total has to allow for its maximum
+CONCURRENT_REQUESTS = 128
 CONCURRENT_REQUESTS_PER_DOMAIN = 32
 DOWNLOAD_WARNSIZE = 67108864
 LOG_LEVEL = 'INFO'
@@ -29,4 +46,24 @@ LOGGING_ENABLED = True
 RANDOMIZE_DOWNLOAD_DELAY = False
 ROBOTSTXT_OBEY = True
 TELNETCONSOLE_ENABLED = False
-linkextractors.IGNORED_EXTENSIONS.remove('pdf')
+# Limits of a single sitemap file, see https://www.sitemaps.org/protocol.html
+SITEMAP_MAX_URLS = 50000
+SITEMAP_MAX_BYTES = 52428800
+SITEMAP_COMPRESS = False
+SITEMAP_COMPRESSLEVEL = 9
+SITEMAP_TIME_BUDGET = 0
+SITEMAP_EXPORT_THREAD = True
+SITEMAP_EXPORT_QUEUE_SIZE = 1000
+SITEMAP_REPORT = True
+SITEMAP_REPORT_INTERVAL = 60.0
+SITEMAP_LINK_REPORT = False
+SITEMAP_CONCURRENCY_ADAPTIVE = True
+SITEMAP_CONCURRENCY_MIN = 4
+SITEMAP_CONCURRENCY_MAX = 128
+SITEMAP_CONCURRENCY_TARGET_LATENCY = 1.0
+SITEMAP_CONCURRENCY_ERROR_RATE = 0.02
+SITEMAP_CONCURRENCY_STEP = 4
+SITEMAP_CONCURRENCY_INTERVAL = 5.0
+SITEMAP_CANONICAL_INDEX_FILES = ['index.html']
+SITEMAP_CANONICAL_STRIP_QUERY = True
+SITEMAP_CANONICAL_TRAILING_SLASH = True
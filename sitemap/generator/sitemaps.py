@@ -0,0 +1,97 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import gzip
+import logging
+import os
+import urllib.parse as urlparse
+
+from lxml import etree
+
+from . import pipelines
+
+
+LOG = logging.getLogger(__name__)
+
+URL_TAG = '{%s}url' % pipelines.SITEMAP_NS
+SITEMAP_TAG = '{%s}sitemap' % pipelines.SITEMAP_NS
+LOC_TAG = '{%s}loc' % pipelines.SITEMAP_NS
+
+
+def open_sitemap(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def iter_entries(path, tags=(URL_TAG, SITEMAP_TAG)):
+    '''Iterate over the url and sitemap elements of a sitemap file.
+
+    The file is parsed incrementally and every element is cleared after it
+    has been processed, so memory use does not grow with the file.
+    '''
+    with open_sitemap(path) as sitemap:
+        for event, element in etree.iterparse(sitemap, tag=tags):
+            yield element
+            element.clear()
+            # Drop the references of the root to processed elements
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+def iter_items(path):
+    '''Iterate over the entries of a sitemap or a sitemap index.
+
+    Every entry is returned as a dictionary of the text of its child
+    elements, e.g. loc and lastmod. The sitemaps listed in an index are
+    expected next to the index, as written by the ExportSitemap pipeline.
+    '''
+    directory = os.path.dirname(path)
+    for element in iter_entries(path):
+        loc = element.findtext(LOC_TAG)
+        if not loc:
+            continue
+        if element.tag == URL_TAG:
+            item = dict((etree.QName(child).localname, child.text.strip())
+                        for child in element if child.text)
+            yield item
+            continue
+        name = os.path.basename(urlparse.urlsplit(loc.strip()).path)
+        shard = os.path.join(directory, name)
+        if os.path.exists(shard):
+            for item in iter_items(shard):
+                yield item
+        else:
+            LOG.warning('Sitemap %s listed in %s not found', name, path)
+
+
+def iter_urls(path):
+    '''Iterate over the URLs of a sitemap or a sitemap index.'''
+    for item in iter_items(path):
+        yield item['loc']
+
+
+def merge(paths):
+    '''Return the entries of several sitemaps sorted by URL.
+
+    Of URLs found more than once the entry with the latest lastmod is
+    kept. Unlike iter_items this does not stream, all entries are kept in
+    memory until they are sorted.
+    '''
+    entries = {}
+    for path in paths:
+        for item in iter_items(path):
+            known = entries.get(item['loc'])
+            lastmod = item.get('lastmod', '')
+            if known is None or lastmod > known.get('lastmod', ''):
+                entries[item['loc']] = item
+    return [entries[loc] for loc in sorted(entries)]
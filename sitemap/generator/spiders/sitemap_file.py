@@ -10,14 +10,47 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import re
+import hashlib
+import json
+import os
 import time
 import urllib.parse as urlparse
+import zlib
 
+from scrapy import exceptions
+from scrapy import http
 from scrapy import item
+from scrapy.link import Link
 from scrapy import linkextractors
+from scrapy import signals
 from scrapy import spiders
 
+from .. import canonical
+from .. import classifier
+from .. import extensions
+from .. import fingerprints
+from .. import handoff
+from .. import links
+from .. import sitemaps
+from .. import state
+
+# Release series and their ranking in the sitemap
+RELEASES = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                        'releases.yaml')
+
+
+def shard_of(url, count):
+    '''Return the shard of a URL, from 1 to count.
+
+    URLs are assigned by host and top-level directory, so all pages of
+    a project end up in the same shard.
+    '''
+    components = urlparse.urlsplit(url)
+    segments = components.path.split('/', 2)
+    top = segments[1] if len(segments) > 2 else ''
+    key = '%s/%s' % (components.netloc, top)
+    return zlib.crc32(key.encode('utf-8')) % count + 1
+
 
 class SitemapItem(item.Item):
     '''Class to represent an item in the sitemap.'''
@@ -26,108 +59,428 @@ class SitemapItem(item.Item):
     priority = item.Field()
     changefreq = item.Field()
 
+    @classmethod
+    def from_entry(cls, entry):
+        '''Create an item from an entry read from a sitemap.'''
+        return cls((field, entry[field]) for field in cls.fields
+                   if field in entry)
+
 
 class SitemapSpider(spiders.CrawlSpider):
     name = 'sitemap'
 
-    MAINT_SERIES = [
-        '2025.1',
-        '2025.2',
-        '2026.1',
+    DENY_DOMAINS = [
+        # docs.o.o redirects to a few sites, filter
+        # them out
+        'docs.opendev.org',
+        'opendev.org',
+        'releases.openstack.org',
+        'zuul-ci.org',
     ]
-    MAINT_RELEASES_PAT = re.compile('^.*/(' + '|'.join(MAINT_SERIES) + ')/')
-    LATEST_PAT = re.compile('^.*/latest/')
+    # Priorities of the release series and the retired series, which are
+    # not part of the sitemap, are maintained in the release table
+    url_classifier = classifier.UrlClassifier.from_table(
+        classifier.load_table(RELEASES),
+        allow=[
+            r'.*\.html',
+            r'.*\.pdf',
+            r'.*\.xml',
+            r'.*\.txt',
+            r'.*/',
+        ],
+        deny_domains=DENY_DOMAINS,
+        # PDF files are part of the sitemap
+        deny_extensions=[
+            extension
+            for extension in linkextractors.IGNORED_EXTENSIONS
+            if extension != 'pdf'
+        ]
+    )
+
+    # Links are requested by their canonical URL, configured with the
+    # SITEMAP_CANONICAL_* settings during a crawl
+    canonicalizer = canonical.UrlCanonicalizer()
+
+    # Unchanged pages are answered with 304 to conditional requests
+    handle_httpstatus_list = [304]
+
+    # Resources without links to follow, only their headers are needed
+    # and they are fetched with HEAD requests
+    HEAD_EXTENSIONS = ('.pdf', '.xml', '.txt')
 
     rules = [
         spiders.Rule(
-            linkextractors.LinkExtractor(
-                allow=[
-                    r'.*\.html',
-                    r'.*\.pdf',
-                    r'.*\.xml',
-                    r'.*\.txt',
-                    r'.*/',
-                ],
-                deny=[
-                    r'/trunk/',
-                    r'/draft/',
-                    r'/austin/',
-                    r'/bexar/',
-                    r'/cactus/',
-                    r'/diablo/',
-                    r'/essex/',
-                    r'/folsom/',
-                    r'/grizzly/',
-                    r'/havana/',
-                    r'/icehouse/',
-                    r'/juno/',
-                    r'/kilo/',
-                    r'/liberty/',
-                    r'/mitaka/',
-                    r'/newton/',
-                    r'/ocata/',
-                    r'/pike/',
-                    r'/queens/',
-                    r'/rocky/',
-                    r'/stein/',
-                    r'/train/',
-                    r'/ussuri/',
-                    r'/victoria/',
-                    r'/wallaby/',
-                    r'/xena/',
-                    r'/yoga/',
-                    r'/zed/',
-                    r'/2023.1/',
-                    r'/2023.2/',
-                    r'/2024.1/',
-                    r'/2024.2/',
-                ],
-                deny_domains=[
-                    # docs.o.o redirects to a few sites, filter
-                    # them out
-                    'docs.opendev.org',
-                    'opendev.org',
-                    'releases.openstack.org',
-                    'zuul-ci.org',
-                ]
-            ),
-            follow=True, callback='parse_item'
+            # Links are filtered by the classifier in filter_links
+            links.HrefLinkExtractor(),
+            follow=True, callback='parse_item',
+            process_links='filter_links',
+            process_request='prepare_request'
         )
     ]
 
-    def __init__(self, domain='docs.openstack.org', urls='', *args, **kwargs):
+    def __init__(self, domain='docs.openstack.org', urls='', seed='',
+                 shard='', scheme='https', *args, **kwargs):
         super(SitemapSpider, self).__init__(*args, **kwargs)
-        self.domain = domain
-        self.allowed_domains = [domain]
-        self.start_urls = ['https://%s' % domain]
+        # Several domains share the downloader, every domain gets its own
+        # sitemap files
+        self.domains = [name.strip() for name in domain.split(',')
+                        if name.strip()]
+        self.domain = self.domains[0]
+        # The offsite filter ignores domains with a port
+        self.allowed_domains = [name.partition(':')[0]
+                                for name in self.domains]
+        self.start_urls = ['%s://%s' % (scheme, name)
+                           for name in self.domains]
         for url in urls.split(','):
             if not url:
                 continue
             self.start_urls.append(url)
+        # Sitemaps of an earlier crawl, their URLs are requested directly
+        self.seed_sitemaps = [path for path in seed.split(',') if path]
+        # Part i of N of a crawl distributed over several processes
+        self.shard = None
+        if shard:
+            index, _, count = shard.partition('/')
+            try:
+                self.shard = (int(index), int(count))
+            except ValueError:
+                self.shard = (0, 0)
+            if not 1 <= self.shard[0] <= self.shard[1]:
+                raise ValueError('Invalid shard %r, expected i/N with '
+                                 '1 <= i <= N' % shard)
+        self.url_state = None
+        # Links of other shards are passed to their process
+        self.handoff = None
+        # Distinct URLs found and their canonical URLs, the difference
+        # is the number of requests saved by canonicalization
+        self.found_urls = fingerprints.FingerprintSet()
+        self.canonical_urls = fingerprints.FingerprintSet()
+        # Redirects found by earlier crawls, their sources are not
+        # requested again
+        self.redirects = {}
+        self.skipped_sources = set()
+        # Links and status of the crawled pages, set by the LinkReport
+        # extension if SITEMAP_LINK_REPORT is enabled
+        self.link_graph = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(SitemapSpider, cls).from_crawler(crawler, *args,
+                                                        **kwargs)
+        if spider.shard is not None:
+            path = crawler.settings.get('SITEMAP_SHARD_DIR')
+            if not path:
+                raise ValueError('A crawl with shard=%d/%d needs '
+                                 'SITEMAP_SHARD_DIR, a directory shared by '
+                                 'all processes of the crawl' % spider.shard)
+            spider.handoff = handoff.LinkHandoff(
+                path, spider.shard,
+                sources=crawler.settings.getbool('SITEMAP_LINK_REPORT'))
+            crawler.signals.connect(spider.spider_idle, signals.spider_idle)
+        path = crawler.settings.get('SITEMAP_STATE_FILE')
+        if path:
+            spider.url_state = state.UrlStateStore(path)
+            spider.redirects = spider.url_state.redirects()
+        if spider.url_state is not None or spider.handoff is not None:
+            crawler.signals.connect(spider.spider_closed,
+                                    signals.spider_closed)
+        spider.canonicalizer = canonical.UrlCanonicalizer.from_settings(
+            crawler.settings)
+        crawler.signals.connect(spider.headers_received,
+                                signals.headers_received)
+        return spider
+
+    @property
+    def stats(self):
+        '''Stats collector of the crawler or None outside of a crawl.'''
+        crawler = getattr(self, 'crawler', None)
+        return crawler.stats if crawler is not None else None
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        for url in self.start_urls:
+            # Other shards get the links of the start page from its shard
+            if self.in_shard(self.canonicalizer.canonicalize(url)):
+                yield http.Request(url, dont_filter=True)
+        # Known pages are fetched in parallel from the start instead of
+        # being discovered hop by hop.
+        for path in self.seed_sitemaps:
+            for url in sitemaps.iter_urls(path):
+                url = self.canonicalizer.canonicalize(url)
+                if self.url_classifier.classify(url) is None:
+                    continue
+                if not self.in_shard(url):
+                    continue
+                yield self.prepare_request(
+                    http.Request(url, meta={'sitemap_seed': True}))
+        if self.url_state is None:
+            return
+        # Request every page known from the last crawl directly, pages
+        # answered with 304 contain no links to follow. Pages which are
+        # gone are not seen by this crawl and removed from the store when
+        # it finishes.
+        for url in self.url_state.urls():
+            if not self.in_shard(url):
+                continue
+            yield self.prepare_request(
+                http.Request(url, meta={'sitemap_seed': True}))
+
+    def prepare_request(self, request, response=None):
+        '''Adjust a request before it is scheduled.'''
+        if not self.in_shard(request.url):
+            # Passed to its own shard by hand_over
+            return request
+        # Pages of maintained releases are requested first
+        request.priority = self.url_classifier.crawl_priority(request.url)
+        path = urlparse.urlsplit(request.url).path.lower()
+        if path.endswith(self.HEAD_EXTENSIONS):
+            # parse_item retries with GET if HEAD is not supported
+            request = request.replace(method='HEAD')
+            request.meta['handle_httpstatus_list'] = [304, 405, 501]
+        return self.add_conditional_headers(request)
+
+    def headers_received(self, headers, body_length, request, spider):
+        '''Stop downloads of which only the headers are needed.'''
+        if spider is self and request.meta.get('sitemap_headers_only'):
+            raise exceptions.StopDownload(fail=False)
+
+    def add_conditional_headers(self, request, response=None):
+        '''Turn a request for a known URL into a conditional request.'''
+        if self.url_state is None:
+            return request
+        known = self.url_state.get(request.url)
+        if known is not None:
+            if known.etag:
+                request.headers['If-None-Match'] = known.etag
+            if known.last_modified:
+                request.headers['If-Modified-Since'] = known.last_modified
+        return request
+
+    def spider_idle(self, spider):
+        '''Crawl links of other shards, stay open until all are done.'''
+        if spider is not self:
+            return
+        if self.receive_links() or not self.handoff.finished():
+            raise exceptions.DontCloseSpider
+
+    def receive_links(self):
+        '''Schedule the links sent by other shards.
+
+        Returns the number of links received.
+        '''
+        rule_index = 0
+        rule = self._rules[rule_index]
+        received = self.handoff.receive()
+        for url, source in received:
+            if self.link_graph is not None and source:
+                self.link_graph.add_links(source, [url])
+            request = rule.process_request(
+                self._build_request(rule_index, Link(url)), None)
+            self.crawler.engine.crawl(request)
+        return len(received)
+
+    def hand_over(self, response, requests):
+        '''Send requests for pages of other shards to their process.
+
+        Returns the requests for pages of this shard.
+        '''
+        kept = []
+        for request in requests:
+            if self.in_shard(request.url):
+                kept.append(request)
+            elif self.handoff is not None:
+                self.handoff.send(shard_of(request.url, self.shard[1]),
+                                  request.url, response.url)
+        return kept
 
+    def spider_closed(self, spider, reason='finished'):
+        '''Write the changes of a finished crawl and close the store.'''
+        if spider is not self:
+            return
+        if self.handoff is not None:
+            self.handoff.close()
+        if self.url_state is None:
+            return
+        if reason == 'finished':
+            removed = self.write_delta()
+            self.url_state.finish(removed)
+        self.url_state.close()
+
+    def write_delta(self):
+        '''Write the URLs added, changed or removed by this crawl.
+
+        Every domain gets a ``sitemap_<domain>.delta.jsonl`` file, with the
+        ``.part-I-of-N`` suffix of a shard, with one JSON object per changed
+        URL. Returns the removed URLs.
+        '''
+        outputs = {}
+        removed = []
+        try:
+            for domain in self.domains:
+                name = extensions.output_name(domain, self.shard)
+                outputs[domain] = open(
+                    os.path.join(os.getcwd(), name + '.delta.jsonl'), 'w')
+            for change, url, lastmod in self.url_state.changes():
+                output = outputs.get(urlparse.urlsplit(url).netloc)
+                if output is None or not self.in_shard(url):
+                    # Crawled by another spider using the same store
+                    continue
+                output.write(json.dumps({'change': change, 'url': url,
+                                         'lastmod': lastmod}) + '\n')
+                if change == state.REMOVED:
+                    removed.append(url)
+        finally:
+            for output in outputs.values():
+                output.close()
+        return removed
+
+    def in_shard(self, url):
+        '''Check if a URL belongs to the shard crawled by this spider.'''
+        if self.shard is None:
+            return True
+        return shard_of(url, self.shard[1]) == self.shard[0]
+
+    def follows_url(self, url):
+        '''Check if a URL is on a crawled domain and part of the sitemap.'''
+        if urlparse.urlsplit(url).netloc not in self.domains:
+            return False
+        return self.url_classifier.classify(url) is not None
+
+    def redirect_found(self, source, target, status=301):
+        '''Keep a redirect found by the crawl for later crawls.'''
+        if self.url_state is not None:
+            self.url_state.set_redirect(source, target)
+        if self.link_graph is not None:
+            self.link_graph.add_redirect(source, target, status)
+
+    def resolve_redirect(self, url):
+        '''Return the target of a known redirect of a URL.
+
+        Returns the URL itself if no redirect is known and None if the
+        target is not crawled.
+        '''
+        target = self.redirects.get(url)
+        if target is None:
+            return url
+        # Follow chains of redirects, but not loops
+        seen = {url}
+        while target in self.redirects and target not in seen:
+            seen.add(target)
+            target = self.redirects[target]
+        # Later links to the sources would be dropped as duplicates
+        saved = seen - self.skipped_sources
+        self.skipped_sources.update(saved)
+        if saved and self.stats is not None:
+            self.stats.inc_value('sitemap/redirects/saved_requests',
+                                 len(saved))
+        target = self.canonicalizer.canonicalize(target)
+        return target if self.follows_url(target) else None
+
+    def count_canonical(self, url, canonical_url):
+        '''Count the requests saved by requesting canonical URLs.'''
+        # Fragments are ignored by the duplicate filter of scrapy anyway
+        self.found_urls.add(url.partition('#')[0])
+        self.canonical_urls.add(canonical_url)
+        if self.stats is not None:
+            self.stats.set_value(
+                'sitemap/canonical/saved_requests',
+                len(self.found_urls) - len(self.canonical_urls))
+
+    def filter_links(self, links):
+        '''Drop links which are not part of the sitemap.
+
+        The remaining links are replaced by their canonical URL, so the
+        duplicate filter drops other URLs of already scheduled pages.
+        '''
+        classify = self.url_classifier.classify
+        filtered = []
+        for link in links:
+            canonical_url = url = self.canonicalizer.canonicalize(link.url)
+            if self.redirects:
+                url = self.resolve_redirect(url)
+                if url is None:
+                    continue
+            if classify(url) is None:
+                continue
+            self.count_canonical(link.url, canonical_url)
+            link.url = url
+            filtered.append(link)
+        return filtered
+
+    def follow_stored_links(self, response):
+        '''Return requests for the stored links of an unchanged page.'''
+        rule_index = 0
+        rule = self._rules[rule_index]
+        found = [Link(url) for url in self.url_state.get_links(response.url)]
+        return [rule.process_request(self._build_request(rule_index, link),
+                                     response)
+                for link in rule.process_links(found)]
+
+    def _requests_to_follow(self, response):
+        start = time.perf_counter()
+        if response.status == 304 and self.url_state is not None:
+            # Pages answered with 304 have no body, their links are the
+            # ones found when the page was last downloaded
+            requests = self.follow_stored_links(response)
+        else:
+            requests = list(super(SitemapSpider, self)._requests_to_follow(
+                response))
+            is_page = isinstance(response, http.HtmlResponse)
+            if self.url_state is not None and is_page:
+                self.url_state.set_links(
+                    response.url, [request.url for request in requests])
+        if self.shard is not None:
+            requests = self.hand_over(response, requests)
+        if self.link_graph is not None:
+            self.link_graph.add_links(
+                response.url, (request.url for request in requests))
+        if self.stats is not None:
+            extensions.record_timing(self.stats, 'link_extraction',
+                                     time.perf_counter() - start)
+        return requests
+
+    def parse_start_url(self, response):
+        if response.meta.get('sitemap_seed'):
+            return self.parse_item(response)
+        return ()
+
+    @extensions.timed('parse_item')
     def parse_item(self, response):
         item = SitemapItem()
-        item['loc'] = response.url
+        # Redirects may lead to other URLs of the page
+        item['loc'] = self.canonicalizer.canonicalize(response.url)
 
         components = urlparse.urlsplit(response.url)
 
-        # Filter out any redirected URLs to other domains
-        if self.domain != components.netloc:
+        # Redirects to other domains are not followed, see
+        # middlewares.SitemapRedirectMiddleware
+        if components.netloc not in self.domains:
             return
 
-        if self.MAINT_RELEASES_PAT.match(components.path):
-            # weekly changefrequency and highest prio for maintained release
-            item['priority'] = '1.0'
-            item['changefreq'] = 'weekly'
-        elif self.LATEST_PAT.match(components.path):
-            # daily changefrequency and normal priority for current files
-            item['priority'] = '0.5'
-            item['changefreq'] = 'daily'
-        else:
-            # These are unversioned documents
-            # daily changefrequency and highest priority for current files
-            item['priority'] = '1.0'
-            item['changefreq'] = 'daily'
+        if response.status in (405, 501):
+            # HEAD is not supported, fall back to GET and stop the
+            # download as soon as the headers arrived
+            meta = dict(response.meta, sitemap_headers_only=True,
+                        handle_httpstatus_list=[304])
+            return response.request.replace(method='GET', meta=meta,
+                                            dont_filter=True)
+
+        classification = self.url_classifier.classify(response.url)
+        if classification is None:
+            return
+        item['priority'], item['changefreq'] = classification
+
+        known = None
+        if self.url_state is not None:
+            known = self.url_state.get(response.url)
+        if response.status == 304 and known is not None:
+            # Unchanged since the last crawl, keep the stored lastmod
+            self.url_state.touch(response.url)
+            item['lastmod'] = known.lastmod
+            return item
 
         if 'Last-Modified' in response.headers:
             timestamp = response.headers['Last-Modified']
@@ -142,4 +495,22 @@ class SitemapSpider(spiders.CrawlSpider):
         formatted_lastmod = (
             formatted_lastmod[:-2] + ":" + formatted_lastmod[-2:])
         item['lastmod'] = formatted_lastmod
+
+        if self.url_state is not None:
+            content_hash = None
+            if response.body:
+                content_hash = hashlib.blake2b(response.body,
+                                               digest_size=16).hexdigest()
+            if content_hash is not None and known is not None:
+                if content_hash == known.content_hash:
+                    # Redeployed without changes, keep the stored lastmod
+                    item['lastmod'] = formatted_lastmod = known.lastmod
+                    if self.stats is not None:
+                        self.stats.inc_value('sitemap/unchanged_content')
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            self.url_state.set(response.url,
+                               etag and etag.decode('utf-8'),
+                               last_modified and last_modified.decode('utf-8'),
+                               formatted_lastmod, content_hash)
         return item
@@ -0,0 +1,226 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+import sqlite3
+import zlib
+
+
+UrlState = collections.namedtuple(
+    'UrlState', ['etag', 'last_modified', 'lastmod', 'content_hash'],
+    defaults=[None])
+
+# Columns added after the first version of the store, with their types
+COLUMNS = [
+    ('content_hash', 'TEXT'),
+    ('first_seen', 'INTEGER DEFAULT 0'),
+    ('changed', 'INTEGER DEFAULT 0'),
+    ('seen', 'INTEGER DEFAULT 0'),
+]
+
+# Number of crawls after which a known redirect is requested again, to
+# notice redirects which have been removed
+REDIRECT_MAX_AGE = 5
+
+ADDED = 'added'
+CHANGED = 'changed'
+REMOVED = 'removed'
+
+
+class UrlStateStore(object):
+    '''Persistent store of the state of crawled URLs.
+
+    For every URL the ETag and Last-Modified headers of the last response,
+    a hash of its content and the lastmod value written to the sitemap are
+    kept in a SQLite database, so a later crawl can send conditional
+    requests.
+
+    Every crawl gets a new generation number, which is recorded for the
+    URLs seen, added or changed by the crawl. A crawl which did not finish
+    keeps its generation when it is resumed.
+
+    Redirects found by a crawl are kept as well, so later crawls do not
+    request their sources again. The links of every page are kept for
+    pages answered with 304 by a later crawl, which have no body.
+    '''
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS urls ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, '
+            'lastmod TEXT)')
+        existing = [row[1] for row in
+                    self.connection.execute('PRAGMA table_info(urls)')]
+        for name, column_type in COLUMNS:
+            if name not in existing:
+                self.connection.execute(
+                    'ALTER TABLE urls ADD COLUMN %s %s' % (name, column_type))
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS redirects ('
+            'source TEXT PRIMARY KEY, target TEXT, generation INTEGER)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS links ('
+            'url TEXT PRIMARY KEY, links BLOB)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS crawls ('
+            'generation INTEGER PRIMARY KEY, finished INTEGER)')
+        last = self.connection.execute(
+            'SELECT generation, finished FROM crawls '
+            'ORDER BY generation DESC LIMIT 1').fetchone()
+        if last is not None and not last[1]:
+            self.generation = last[0]
+        else:
+            self.generation = last[0] + 1 if last is not None else 1
+            self.connection.execute(
+                'INSERT INTO crawls VALUES (?, 0)', (self.generation,))
+        self.connection.commit()
+        self.pending = 0
+
+    def get(self, url):
+        '''Return the stored state of a URL or None.'''
+        row = self.connection.execute(
+            'SELECT etag, last_modified, lastmod, content_hash FROM urls '
+            'WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        return UrlState(*row)
+
+    def set(self, url, etag, last_modified, lastmod, content_hash=None):
+        '''Store the state of a URL seen by the current crawl.
+
+        The URL is recorded as changed if the lastmod value differs from
+        the stored one.
+        '''
+        self.connection.execute(
+            'INSERT INTO urls (url, etag, last_modified, lastmod, '
+            'content_hash, first_seen, changed, seen) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(url) DO UPDATE '
+            'SET etag = excluded.etag, '
+            'last_modified = excluded.last_modified, '
+            'lastmod = excluded.lastmod, '
+            'content_hash = excluded.content_hash, '
+            'changed = CASE WHEN lastmod IS excluded.lastmod '
+            'THEN changed ELSE excluded.changed END, '
+            'seen = excluded.seen',
+            (url, etag, last_modified, lastmod, content_hash,
+             self.generation, self.generation, self.generation))
+        self._written()
+
+    def touch(self, url):
+        '''Record an unchanged URL as seen by the current crawl.'''
+        self.connection.execute('UPDATE urls SET seen = ? WHERE url = ?',
+                                (self.generation, url))
+        self._written()
+
+    def delete(self, url):
+        self.connection.execute('DELETE FROM urls WHERE url = ?', (url,))
+        self.connection.execute('DELETE FROM links WHERE url = ?', (url,))
+        self._written()
+
+    def set_links(self, url, links):
+        '''Store the URLs a page links to.'''
+        data = zlib.compress('\n'.join(links).encode('utf-8'))
+        self.connection.execute('INSERT OR REPLACE INTO links VALUES (?, ?)',
+                                (url, data))
+        self._written()
+
+    def get_links(self, url):
+        '''Return the URLs a page linked to when it was last downloaded.'''
+        row = self.connection.execute(
+            'SELECT links FROM links WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return []
+        data = zlib.decompress(row[0]).decode('utf-8')
+        return data.split('\n') if data else []
+
+    def urls(self):
+        '''Iterate over all URLs known at the time of the call.
+
+        URLs are read in batches so the store can be updated while the
+        iteration is in progress.
+        '''
+        last = 0
+        end = self.connection.execute(
+            'SELECT max(rowid) FROM urls').fetchone()[0] or 0
+        while last < end:
+            rows = self.connection.execute(
+                'SELECT rowid, url FROM urls WHERE rowid > ? AND rowid <= ? '
+                'ORDER BY rowid LIMIT ?',
+                (last, end, self.BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            for rowid, url in rows:
+                yield url
+            last = rows[-1][0]
+
+    def set_redirect(self, source, target):
+        '''Store a redirect found by the current crawl.'''
+        self.connection.execute(
+            'INSERT OR REPLACE INTO redirects VALUES (?, ?, ?)',
+            (source, target, self.generation))
+        self._written()
+
+    def redirects(self):
+        '''Return a dict of the sources and targets of recent redirects.
+
+        Redirects not found again by the last REDIRECT_MAX_AGE crawls are
+        left out, so their sources are requested again.
+        '''
+        rows = self.connection.execute(
+            'SELECT source, target FROM redirects WHERE generation > ?',
+            (self.generation - REDIRECT_MAX_AGE,))
+        return dict(rows)
+
+    def changes(self):
+        '''Iterate over the changes of the current crawl.
+
+        Yields (change, url, lastmod) tuples, change is one of ADDED,
+        CHANGED or REMOVED. URLs not seen by the current crawl are removed.
+        '''
+        self.connection.commit()
+        rows = self.connection.execute(
+            'SELECT url, lastmod, first_seen, seen FROM urls '
+            'WHERE seen < ? OR changed = ? ORDER BY url',
+            (self.generation, self.generation))
+        for url, lastmod, first_seen, seen in rows:
+            if seen < self.generation:
+                yield REMOVED, url, lastmod
+            elif first_seen == self.generation:
+                yield ADDED, url, lastmod
+            else:
+                yield CHANGED, url, lastmod
+
+    def finish(self, removed=()):
+        '''Mark the current crawl as finished.
+
+        The given URLs, usually the removed ones, are deleted.
+        '''
+        for url in removed:
+            self.delete(url)
+        self.connection.execute(
+            'UPDATE crawls SET finished = 1 WHERE generation = ?',
+            (self.generation,))
+        self.connection.commit()
+        self.pending = 0
+
+    def _written(self):
+        self.pending += 1
+        if self.pending >= self.BATCH_SIZE:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,69 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+import scrapy.settings
+
+from sitemap.generator import canonical
+
+
+class TestUrlCanonicalizer(unittest.TestCase):
+
+    def setUp(self):
+        self.canonicalizer = canonical.UrlCanonicalizer()
+
+    def test_canonical_url_is_unchanged(self):
+        url = 'https://docs.openstack.org/nova/latest/admin.html'
+        self.assertEqual(url, self.canonicalizer.canonicalize(url))
+
+    def test_variants(self):
+        for url in ('https://docs.openstack.org/nova/latest/index.html',
+                    'https://docs.openstack.org/nova/latest/?x=1',
+                    'https://docs.openstack.org/nova/latest/#install',
+                    'https://docs.openstack.org/nova/latest',
+                    'https://DOCS.openstack.org/nova/latest/'):
+            self.assertEqual(
+                'https://docs.openstack.org/nova/latest/',
+                self.canonicalizer.canonicalize(url))
+
+    def test_empty_path(self):
+        self.assertEqual(
+            'https://docs.openstack.org/',
+            self.canonicalizer.canonicalize('https://docs.openstack.org'))
+
+    def test_rules_can_be_disabled(self):
+        canonicalizer = canonical.UrlCanonicalizer(
+            index_files=(), strip_query=False, trailing_slash=False)
+
+        for url in ('https://docs.openstack.org/nova/index.html',
+                    'https://docs.openstack.org/nova/?x=1',
+                    'https://docs.openstack.org/nova'):
+            self.assertEqual(url, canonicalizer.canonicalize(url))
+        self.assertEqual(
+            'https://docs.openstack.org/nova/',
+            canonicalizer.canonicalize('https://docs.openstack.org/nova/#a'))
+
+    def test_from_settings(self):
+        settings = {'SITEMAP_CANONICAL_INDEX_FILES': 'index.htm,index.html',
+                    'SITEMAP_CANONICAL_STRIP_QUERY': 'False'}
+        canonicalizer = canonical.UrlCanonicalizer.from_settings(
+            scrapy.settings.Settings(settings))
+
+        self.assertEqual(
+            'https://docs.openstack.org/?x=1',
+            canonicalizer.canonicalize(
+                'https://docs.openstack.org/index.htm?x=1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tempfile
+import unittest
+
+from sitemap.generator import classifier
+from sitemap.generator.spiders import sitemap_file
+
+MAINTAINED_CLASS = ('1.0', 'weekly')
+LATEST_CLASS = ('0.5', 'daily')
+DEFAULT_CLASS = ('1.0', 'daily')
+
+TABLE = """
+classes:
+  retired:
+    segments: ['trunk', 'zed']
+  maintained:
+    priority: '1.0'
+    changefreq: 'weekly'
+    crawl_priority: 20
+    segments: ['2026.1']
+  latest:
+    priority: 0.5
+    changefreq: 'daily'
+    segments: ['latest']
+default:
+  priority: '1.0'
+  changefreq: 'daily'
+"""
+
+
+class TestUrlClassifier(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'releases.yaml')
+            with open(path, 'w') as table_file:
+                table_file.write(TABLE)
+            table = classifier.load_table(path)
+        self.classifier = classifier.UrlClassifier.from_table(
+            table,
+            allow=[r'.*\.html', r'.*/'],
+            deny_domains=['opendev.org'],
+            deny_extensions=['png'])
+
+    def test_maintained(self):
+        self.assertEqual(
+            MAINTAINED_CLASS,
+            self.classifier.classify(
+                'https://docs.openstack.org/nova/2026.1/index.html'))
+
+    def test_latest(self):
+        self.assertEqual(
+            LATEST_CLASS,
+            self.classifier.classify(
+                'https://docs.openstack.org/nova/latest/index.html'))
+
+    def test_maintained_wins_over_latest(self):
+        self.assertEqual(
+            MAINTAINED_CLASS,
+            self.classifier.classify(
+                'https://docs.openstack.org/latest/2026.1/index.html'))
+
+    def test_unversioned(self):
+        self.assertEqual(
+            DEFAULT_CLASS,
+            self.classifier.classify(
+                'https://docs.openstack.org/contributor-guide/'))
+
+    def test_file_name_is_not_a_directory(self):
+        self.assertEqual(
+            DEFAULT_CLASS,
+            self.classifier.classify('https://docs.openstack.org/zed'))
+
+    def test_denied_segment(self):
+        self.assertIsNone(self.classifier.classify(
+            'https://docs.openstack.org/nova/zed/index.html'))
+        self.assertIsNone(self.classifier.classify(
+            'https://docs.openstack.org/trunk/2026.1/index.html'))
+
+    def test_denied_domain(self):
+        self.assertIsNone(self.classifier.classify('https://opendev.org/'))
+        self.assertIsNone(
+            self.classifier.classify('https://docs.opendev.org/'))
+
+    def test_denied_extension(self):
+        self.assertIsNone(self.classifier.classify(
+            'https://docs.openstack.org/_static/logo.PNG'))
+
+    def test_not_allowed(self):
+        self.assertIsNone(self.classifier.classify('mailto:foo'))
+
+    def test_crawl_priority(self):
+        self.assertEqual(20, self.classifier.crawl_priority(
+            'https://docs.openstack.org/latest/2026.1/index.html'))
+        self.assertEqual(0, self.classifier.crawl_priority(
+            'https://docs.openstack.org/nova/latest/index.html'))
+        self.assertEqual(0, self.classifier.crawl_priority(
+            'https://docs.openstack.org/contributor-guide/'))
+
+    def test_unquoted_series(self):
+        table = {'classes': {'maintained': {'priority': 1.0,
+                                            'changefreq': 'weekly',
+                                            'segments': [2025.2]}}}
+        url_classifier = classifier.UrlClassifier.from_table(table)
+
+        self.assertEqual(
+            MAINTAINED_CLASS,
+            url_classifier.classify('https://docs.openstack.org/2025.2/'))
+        self.assertEqual(
+            classifier.DEFAULT_CLASS,
+            url_classifier.classify('https://docs.openstack.org/'))
+
+    def test_release_table(self):
+        url_classifier = sitemap_file.SitemapSpider.url_classifier
+
+        self.assertIsNone(url_classifier.classify(
+            'https://docs.openstack.org/nova/folsom/index.html'))
+        self.assertEqual(LATEST_CLASS, url_classifier.classify(
+            'https://docs.openstack.org/nova/latest/index.html'))
+
+
+if __name__ == '__main__':
+    unittest.main()
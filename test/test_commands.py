@@ -0,0 +1,107 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import argparse
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from scrapy import exceptions
+from scrapy import settings
+
+from sitemap.generator.commands import filter as filter_command
+from sitemap.generator.commands import merge
+from sitemap.generator import pipelines
+from sitemap.generator import sitemaps
+
+
+class CommandTestCase(unittest.TestCase):
+
+    DOMAIN = '127.0.0.1:8000'
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def _write(self, urls, shard=None):
+        spider = mock.MagicMock()
+        spider.domains = [self.DOMAIN]
+        spider.shard = shard
+        pipeline = pipelines.ExportSitemap()
+        pipeline.export(spider, ({'loc': 'http://%s/%s' % (self.DOMAIN, url)}
+                                 for url in urls))
+
+    def _run(self, module, args, **options):
+        command = module.Command()
+        command.settings = settings.Settings()
+        command.run(args, argparse.Namespace(**options))
+
+
+class TestMerge(CommandTestCase):
+
+    def setUp(self):
+        super(TestMerge, self).setUp()
+        self._write(['b.html', 'c.html'], shard=(1, 2))
+        self._write(['a.html', 'c.html'], shard=(2, 2))
+        self.parts = ['sitemap_%s.part-%d-of-2.xml' % (self.DOMAIN, index)
+                      for index in (1, 2)]
+
+    def test_sitemap_of_domain(self):
+        self._run(merge, self.parts)
+
+        self.assertEqual(
+            ['http://%s/%s.html' % (self.DOMAIN, name) for name in 'abc'],
+            list(sitemaps.iter_urls('sitemap_%s.xml' % self.DOMAIN)))
+        self.assertEqual(
+            sorted(self.parts + ['sitemap_%s.xml' % self.DOMAIN]),
+            sorted(os.listdir(self.tmpdir.name)))
+
+    def test_existing_sitemap_is_kept(self):
+        self._write(['old.html'])
+
+        self.assertRaises(exceptions.UsageError, self._run, merge, self.parts)
+        self.assertEqual(['http://%s/old.html' % self.DOMAIN],
+                         list(sitemaps.iter_urls('sitemap_%s.xml'
+                                                 % self.DOMAIN)))
+
+
+class TestFilter(CommandTestCase):
+
+    def setUp(self):
+        super(TestFilter, self).setUp()
+        self._write(['index.html', 'style.css', 'nova/'])
+
+    def test_sitemap_of_domain(self):
+        self._run(filter_command, ['sitemap_%s.xml' % self.DOMAIN],
+                  output_dir='filtered')
+
+        self.assertEqual(['sitemap_%s.xml' % self.DOMAIN],
+                         os.listdir('filtered'))
+        self.assertEqual(
+            ['http://%s/index.html' % self.DOMAIN,
+             'http://%s/nova/' % self.DOMAIN],
+            list(sitemaps.iter_urls(os.path.join(
+                'filtered', 'sitemap_%s.xml' % self.DOMAIN))))
+
+    def test_output_dir_of_sitemaps(self):
+        self.assertRaises(exceptions.UsageError, self._run, filter_command,
+                          ['sitemap_%s.xml' % self.DOMAIN], output_dir='.')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,313 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from scrapy.core import downloader
+from scrapy import exceptions
+from scrapy import settings
+from scrapy import statscollectors
+from twisted.internet import defer
+
+from sitemap.generator import extensions
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = extensions.Histogram()
+        for i in range(90):
+            histogram.add(0.0001)
+        for i in range(10):
+            histogram.add(1.5)
+
+        self.assertEqual(100, histogram.count)
+        self.assertEqual(0.0005, histogram.percentile(0.5))
+        self.assertEqual(0.0005, histogram.percentile(0.9))
+        self.assertEqual(1.5, histogram.percentile(0.99))
+        self.assertEqual(1.5, histogram.max)
+
+    def test_merge(self):
+        histogram = extensions.Histogram()
+        histogram.add(0.0001)
+        other = extensions.Histogram()
+        other.add(1.5)
+        other.add(1.5)
+
+        histogram.merge(other)
+
+        self.assertEqual(3, histogram.count)
+        self.assertEqual(1.5, histogram.max)
+        self.assertEqual(1.5, histogram.percentile(0.9))
+
+    def test_empty(self):
+        histogram = extensions.Histogram()
+
+        self.assertEqual(0.0, histogram.percentile(0.5))
+        self.assertEqual(0, histogram.to_dict()['count'])
+
+    def test_outside_of_buckets(self):
+        histogram = extensions.Histogram()
+        histogram.add(1000.0)
+
+        self.assertEqual([[None, 1]], histogram.to_dict()['buckets'])
+
+
+class TestTimed(unittest.TestCase):
+
+    class Component(object):
+        stats = None
+
+        @extensions.timed('stage')
+        def run(self, value):
+            return value
+
+    def test_records_duration(self):
+        component = self.Component()
+        component.stats = statscollectors.MemoryStatsCollector(
+            mock.MagicMock())
+
+        self.assertEqual('value', component.run('value'))
+        histogram = component.stats.get_value('sitemap/timing/stage')
+        self.assertEqual(1, histogram.count)
+
+    def test_without_stats(self):
+        self.assertEqual('value', self.Component().run('value'))
+
+
+class TestCrawlReport(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.stats = statscollectors.MemoryStatsCollector(mock.MagicMock())
+        self.spider = mock.MagicMock()
+        self.spider.domain = 'docs.openstack.org'
+        self.spider.shard = None
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_from_crawler_not_configured(self):
+        crawler = mock.MagicMock()
+        crawler.settings.getbool.return_value = False
+
+        with self.assertRaises(extensions.exceptions.NotConfigured):
+            extensions.CrawlReport.from_crawler(crawler)
+
+    def test_writes_report(self):
+        report = extensions.CrawlReport(self.stats, interval=0)
+        report.spider_opened(self.spider)
+        response = mock.MagicMock()
+        response.meta = {'download_latency': 0.2}
+        report.response_received(response, None, self.spider)
+        self.stats.set_value('response_received_count', 1)
+        self.stats.set_value('sitemap/duplicates', 2)
+        report.spider_closed(self.spider, 'finished')
+        self.assertFalse(os.path.exists(
+            'sitemap_docs.openstack.org.report.json'))
+        # Written by the pipelines after the extensions saw spider_closed
+        extensions.record_timing(self.stats, 'export_close', 0.1)
+        report.engine_stopped()
+
+        with open('sitemap_docs.openstack.org.report.json') as report_file:
+            data = json.load(report_file)
+        self.assertEqual('finished', data['finish_reason'])
+        self.assertEqual(1, data['pages'])
+        self.assertEqual(2, data['duplicates'])
+        self.assertEqual(1, data['stages']['download']['count'])
+        self.assertEqual(1, len(data['samples']))
+        self.assertEqual(1, data['stages']['export_close']['count'])
+
+
+class TestLinkReport(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.stats = statscollectors.MemoryStatsCollector(mock.MagicMock())
+        self.spider = mock.MagicMock()
+        self.spider.domain = 'docs.openstack.org'
+        self.spider.shard = None
+        self.spider.start_urls = ['https://docs.openstack.org']
+        self.spider.canonicalizer.canonicalize.return_value = (
+            'https://docs.openstack.org/')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_from_crawler_not_configured(self):
+        crawler = mock.MagicMock()
+        crawler.settings.getbool.return_value = False
+
+        with self.assertRaises(extensions.exceptions.NotConfigured):
+            extensions.LinkReport.from_crawler(crawler)
+
+    def test_writes_report(self):
+        report = extensions.LinkReport(self.stats)
+        report.spider_opened(self.spider)
+        self.spider.link_graph.add_links(
+            'https://docs.openstack.org/',
+            ['https://docs.openstack.org/gone/'])
+        for url, status in (('https://docs.openstack.org/', 200),
+                            ('https://docs.openstack.org/gone/', 404),
+                            ('https://docs.openstack.org/orphan/', 200)):
+            report.response_received(mock.Mock(url=url, status=status),
+                                     None, self.spider)
+        report.spider_closed(self.spider, 'finished')
+
+        with open('sitemap_docs.openstack.org.links.json') as report_file:
+            data = json.load(report_file)
+        self.assertEqual(
+            [{'source': 'https://docs.openstack.org/',
+              'target': 'https://docs.openstack.org/gone/', 'status': 404}],
+            data['broken_links'])
+        self.assertEqual(['https://docs.openstack.org/orphan/'],
+                         data['orphans'])
+        self.assertEqual(1, self.stats.get_value('sitemap/links/broken'))
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        self.slot = downloader.Slot(8, 0, 0)
+        self.crawler = mock.MagicMock()
+        self.crawler.engine.downloader.slots = {'docs.openstack.org':
+                                                self.slot}
+        self.crawler.stats = statscollectors.MemoryStatsCollector(
+            mock.MagicMock())
+        self.extension = extensions.AdaptiveConcurrency(
+            self.crawler, min_concurrency=4, max_concurrency=16,
+            target_latency=1.0, step=4)
+
+    def _respond(self, count, status=200, latency=0.1, active=0):
+        self.slot.active = set(range(active))
+        for i in range(count):
+            request = mock.MagicMock()
+            request.meta = {'download_slot': 'docs.openstack.org',
+                            'download_latency': latency}
+            response = mock.MagicMock()
+            response.status = status
+            self.extension.response_downloaded(response, request, None)
+
+    def test_from_crawler_not_configured(self):
+        crawler = mock.MagicMock()
+        crawler.settings.getbool.return_value = False
+
+        with self.assertRaises(extensions.exceptions.NotConfigured):
+            extensions.AdaptiveConcurrency.from_crawler(crawler)
+
+    def test_increases_when_saturated(self):
+        self._respond(30, active=8)
+        self.extension.adjust()
+
+        self.assertEqual(12, self.slot.concurrency)
+        self.assertEqual(
+            1, self.crawler.stats.get_value('sitemap/concurrency/changes'))
+
+    def test_keeps_when_not_saturated(self):
+        self._respond(30, active=2)
+        self.extension.adjust()
+
+        self.assertEqual(8, self.slot.concurrency)
+
+    def test_upper_bound(self):
+        for i in range(5):
+            self._respond(30, active=self.slot.concurrency)
+            self.extension.adjust()
+
+        self.assertEqual(16, self.slot.concurrency)
+
+    def test_decreases_on_latency(self):
+        self._respond(30, latency=3.0, active=8)
+        self.extension.adjust()
+
+        self.assertEqual(6, self.slot.concurrency)
+
+    def test_halves_on_throttling(self):
+        self._respond(29)
+        self._respond(1, status=429)
+        self.extension.adjust()
+
+        self.assertEqual(4, self.slot.concurrency)
+
+    def test_lower_bound_on_errors(self):
+        self.slot.concurrency = 5
+        self._respond(20)
+        self._respond(10, status=503)
+        self.extension.adjust()
+
+        self.assertEqual(4, self.slot.concurrency)
+
+    def test_waits_for_enough_responses(self):
+        self._respond(10, active=8)
+        self.extension.adjust()
+        self.assertEqual(8, self.slot.concurrency)
+
+        self._respond(10, active=8)
+        self.extension.adjust()
+        self.assertEqual(12, self.slot.concurrency)
+
+
+class TestTimeBudget(unittest.TestCase):
+
+    def test_from_crawler_not_configured(self):
+        crawler = mock.MagicMock()
+        crawler.settings = settings.Settings()
+
+        with self.assertRaises(exceptions.NotConfigured):
+            extensions.TimeBudget.from_crawler(crawler)
+
+    def test_closes_crawl(self):
+        crawler = mock.MagicMock()
+        extension = extensions.TimeBudget(crawler, 60.0)
+        extension.task = mock.MagicMock()
+
+        with mock.patch.object(extensions, 'deferred_from_coro'):
+            extension.expired()
+
+        extension.task.stop.assert_called_once_with()
+        crawler.engine.close_spider_async.assert_called_once_with(
+            reason=extensions.TIME_BUDGET_REASON)
+
+    def test_queued_requests_are_dropped(self):
+        crawler = mock.MagicMock()
+        slot = mock.Mock(queue=collections.deque())
+        crawler.engine.downloader.slots = {'docs.openstack.org': slot}
+        queued = [defer.Deferred() for i in range(3)]
+        for deferred in queued:
+            slot.queue.append((mock.sentinel.request, deferred))
+        failures = []
+        for deferred in queued:
+            deferred.addErrback(failures.append)
+        extension = extensions.TimeBudget(crawler, 60.0)
+
+        extension.drop_queued()
+
+        self.assertEqual(0, len(slot.queue))
+        self.assertEqual(3, len(failures))
+        self.assertTrue(failures[0].check(exceptions.IgnoreRequest))
+        crawler.stats.set_value.assert_called_once_with(
+            'sitemap/time_budget/dropped_requests', 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
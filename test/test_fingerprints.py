@@ -0,0 +1,79 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tempfile
+import unittest
+
+from sitemap.generator import fingerprints
+
+
+class TestFingerprintSet(unittest.TestCase):
+
+    def test_fingerprint_is_not_zero(self):
+        self.assertNotEqual(0, fingerprints.fingerprint(''))
+
+    def test_add_and_contains(self):
+        urls = fingerprints.FingerprintSet()
+        urls.add('https://docs.openstack.org/')
+
+        self.assertIn('https://docs.openstack.org/', urls)
+        self.assertNotIn('https://docs.openstack.org/latest/', urls)
+
+    def test_add_twice(self):
+        urls = fingerprints.FingerprintSet()
+        urls.add('https://docs.openstack.org/')
+        urls.add('https://docs.openstack.org/')
+
+        self.assertEqual(1, len(urls))
+
+    def test_grow(self):
+        urls = fingerprints.FingerprintSet(capacity=4)
+        for i in range(1000):
+            urls.add('https://docs.openstack.org/%d.html' % i)
+
+        self.assertEqual(1000, len(urls))
+        self.assertGreater(len(urls.table) * urls.MAX_LOAD, 1000)
+        for i in range(1000):
+            self.assertIn('https://docs.openstack.org/%d.html' % i, urls)
+
+    def test_on_disk(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'fingerprints')
+            urls = fingerprints.FingerprintSet(path, capacity=4)
+            for i in range(1000):
+                urls.add('https://docs.openstack.org/%d.html' % i)
+
+            self.assertEqual(len(urls.table) * 8, os.path.getsize(path))
+            self.assertIn('https://docs.openstack.org/999.html', urls)
+            urls.close()
+            self.assertEqual([], os.listdir(tmpdir))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            urls = fingerprints.FingerprintSet(capacity=4)
+            for i in range(100):
+                urls.add('https://docs.openstack.org/%d.html' % i)
+            urls.save(os.path.join(tmpdir, 'dump'))
+
+            loaded = fingerprints.FingerprintSet.load(
+                os.path.join(tmpdir, 'dump'),
+                os.path.join(tmpdir, 'table'))
+
+            self.assertEqual(100, len(loaded))
+            self.assertIn('https://docs.openstack.org/99.html', loaded)
+            self.assertNotIn('https://docs.openstack.org/100.html', loaded)
+            loaded.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tempfile
+import unittest
+
+from sitemap.generator import handoff
+
+URL = 'https://docs.openstack.org/nova/latest/'
+PAGE = 'https://docs.openstack.org/'
+
+
+class TestLinkHandoff(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.first = handoff.LinkHandoff(self.tmpdir.name, (1, 2))
+        self.second = handoff.LinkHandoff(self.tmpdir.name, (2, 2))
+
+    def tearDown(self):
+        self.first.close()
+        self.second.close()
+        self.tmpdir.cleanup()
+
+    def test_links_are_received_once(self):
+        self.first.send(2, URL, PAGE)
+        self.first.send(2, URL, PAGE)
+        self.first.write_status(idle=False)
+
+        self.assertEqual([(URL, '')], self.second.receive())
+        self.assertEqual([], self.second.receive())
+
+    def test_sources_are_sent_for_link_report(self):
+        self.first.sources = True
+        self.first.send(2, URL, PAGE)
+        self.first.send(2, URL, PAGE + 'install/')
+        self.first.write_status(idle=False)
+
+        self.assertEqual([(URL, PAGE), (URL, PAGE + 'install/')],
+                         self.second.receive())
+
+    def test_incomplete_lines_are_not_received(self):
+        path = os.path.join(self.tmpdir.name, 'links-2-from-1.txt')
+        with open(path, 'w') as links:
+            links.write(URL + '\t\n' + PAGE)
+
+        self.assertEqual([(URL, '')], self.second.receive())
+
+    def test_finished_when_all_shards_read_their_links(self):
+        self.assertFalse(self.first.finished())
+        self.first.send(2, URL)
+        self.assertTrue(self.second.finished())
+        self.assertFalse(self.first.finished())
+
+        self.second.receive()
+        self.assertFalse(self.first.finished())
+        self.assertTrue(self.second.finished())
+        self.assertTrue(self.first.finished())
+
+    def test_resumed_shard_keeps_position(self):
+        self.first.send(2, URL)
+        self.first.write_status(idle=False)
+        self.second.receive()
+        self.second.write_status(idle=True)
+
+        resumed = handoff.LinkHandoff(self.tmpdir.name, (2, 2))
+        self.assertEqual([], resumed.receive())
@@ -0,0 +1,105 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import scrapy
+from scrapy import exceptions
+from scrapy.utils import request as request_utils
+
+from sitemap.generator import httpcache
+
+
+class TestResponseStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'responses.db')
+        self.spider = mock.MagicMock()
+        self.spider.crawler.request_fingerprinter = (
+            request_utils.RequestFingerprinter())
+        self.request = scrapy.Request('https://docs.openstack.org/')
+        self.response = scrapy.http.HtmlResponse(
+            'https://docs.openstack.org/', status=200,
+            headers={'Content-Type': 'text/html',
+                     'Last-Modified': 'Fri, 16 Oct 2026 10:00:00 GMT'},
+            body=b'<a href="nova/">Nova</a>')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _record(self, **kwargs):
+        store = httpcache.ResponseStore(self.path, record=True, **kwargs)
+        store.open_spider(self.spider)
+        self.assertIsNone(store.retrieve_response(self.spider, self.request))
+        store.store_response(self.spider, self.request, self.response)
+        store.close_spider(self.spider)
+
+    def _replay(self, request):
+        store = httpcache.ResponseStore(self.path)
+        store.open_spider(self.spider)
+        response = store.retrieve_response(self.spider, request)
+        store.store_response(self.spider, request, self.response)
+        store.close_spider(self.spider)
+        return response
+
+    def test_replay(self):
+        self._record()
+        response = self._replay(self.request)
+
+        self.assertIsInstance(response, scrapy.http.HtmlResponse)
+        self.assertEqual(200, response.status)
+        self.assertEqual(self.response.body, response.body)
+        self.assertEqual(b'Fri, 16 Oct 2026 10:00:00 GMT',
+                         response.headers['Last-Modified'])
+
+    def test_replay_without_bodies(self):
+        self._record(bodies=False)
+        response = self._replay(self.request)
+
+        self.assertEqual(b'', response.body)
+        self.assertEqual(b'Fri, 16 Oct 2026 10:00:00 GMT',
+                         response.headers['Last-Modified'])
+
+    def test_unknown_request(self):
+        self._record()
+
+        self.assertIsNone(self._replay(
+            self.request.replace(method='HEAD')))
+
+
+class TestRecordReplayMiddleware(unittest.TestCase):
+
+    def _middleware(self, **settings):
+        return httpcache.RecordReplayMiddleware(
+            scrapy.settings.Settings(settings), mock.MagicMock())
+
+    def test_disabled(self):
+        with self.assertRaises(exceptions.NotConfigured):
+            self._middleware()
+
+    def test_record_and_replay(self):
+        with self.assertRaises(ValueError):
+            self._middleware(SITEMAP_RECORD='a.db', SITEMAP_REPLAY='b.db')
+
+    def test_replay_ignores_missing(self):
+        middleware = self._middleware(SITEMAP_REPLAY='responses.db')
+
+        self.assertTrue(middleware.ignore_missing)
+        self.assertFalse(middleware.storage.record)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from sitemap.generator import linkgraph
+
+BASE = 'https://docs.openstack.org/'
+
+
+class TestLinkGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = linkgraph.LinkGraph()
+        self.graph.add_links(BASE, [BASE + 'nova/', BASE + 'gone/',
+                                    BASE + 'old/', BASE + 'nova/'])
+        self.graph.add_links(BASE + 'nova/', [BASE])
+        self.graph.add_redirect(BASE + 'old/', BASE + 'moved/', 301)
+        self.graph.add_redirect(BASE + 'moved/', BASE + 'nova/', 302)
+        for url in (BASE, BASE + 'nova/', BASE + 'orphan/'):
+            self.graph.set_status(url, 200)
+        self.graph.set_status(BASE + 'gone/', 404)
+
+    def test_urls_are_interned(self):
+        self.assertEqual(6, len(self.graph))
+        self.assertEqual(1, self.graph.url_id(BASE + 'nova/'))
+        self.assertEqual(4, len(self.graph.sources))
+
+    def test_broken_links(self):
+        self.assertEqual([(BASE, BASE + 'gone/', 404)],
+                         list(self.graph.broken_links()))
+
+    def test_broken_link_behind_redirect(self):
+        self.graph.add_redirect(BASE + 'nova/', BASE + 'gone/', 301)
+
+        self.assertIn((BASE, BASE + 'old/', 404),
+                      list(self.graph.broken_links()))
+
+    def test_orphans(self):
+        self.assertEqual([BASE + 'orphan/'], list(self.graph.orphans()))
+
+    def test_not_modified_pages_can_be_orphans(self):
+        self.graph.set_status(BASE + 'orphan/', 304)
+
+        self.assertEqual([BASE + 'orphan/'], list(self.graph.orphans()))
+
+    def test_ids_use_four_bytes(self):
+        self.assertEqual(4, self.graph.sources.itemsize)
+        self.assertEqual(4, self.graph.targets.itemsize)
+        self.assertEqual(4, self.graph.redirects.itemsize)
+
+    def test_roots_are_not_orphans(self):
+        graph = linkgraph.LinkGraph()
+        graph.set_status(BASE, 200)
+
+        self.assertEqual([BASE], list(graph.orphans()))
+        self.assertEqual([], list(graph.orphans(roots=[BASE])))
+
+    def test_redirect_chains(self):
+        self.assertEqual(
+            [([BASE + 'old/', BASE + 'moved/', BASE + 'nova/'], 200)],
+            list(self.graph.redirect_chains()))
+
+    def test_redirect_loop(self):
+        self.graph.add_redirect(BASE + 'nova/', BASE + 'old/', 301)
+
+        self.assertEqual([1, 3, 4], self.graph.chain(1))
+        self.assertEqual([], list(self.graph.redirect_chains()))
+
+    def test_report(self):
+        report = self.graph.report(roots=[BASE])
+
+        self.assertEqual(6, report['urls'])
+        self.assertEqual(
+            [{'source': BASE, 'target': BASE + 'gone/', 'status': 404}],
+            report['broken_links'])
+        self.assertEqual([BASE + 'orphan/'], report['orphans'])
+        self.assertEqual(1, len(report['redirect_chains']))
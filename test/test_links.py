@@ -0,0 +1,75 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from scrapy import http
+from scrapy import linkextractors
+
+from sitemap.generator import links
+
+
+URL = 'https://docs.openstack.org/nova/latest/admin/index.html'
+
+
+class TestHrefLinkExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.extractor = links.HrefLinkExtractor()
+
+    def extract(self, body, url=URL):
+        response = http.HtmlResponse(url, body=body, encoding='utf-8')
+        return [link.url for link in self.extractor.extract_links(response)]
+
+    def test_relative_links(self):
+        body = (b'<html><body><a href="page.html">x</a>'
+                b'<a href=" ../../install/ ">y</a>'
+                b'<map><area href="/glance/latest/"></map></body></html>')
+        self.assertEqual(
+            ['https://docs.openstack.org/nova/latest/admin/page.html',
+             'https://docs.openstack.org/nova/install/',
+             'https://docs.openstack.org/glance/latest/'],
+            self.extract(body))
+
+    def test_base_href(self):
+        body = (b'<html><head><base href="/cinder/latest/"></head>'
+                b'<body><a href="index.html">x</a></body></html>')
+        self.assertEqual(
+            ['https://docs.openstack.org/cinder/latest/index.html'],
+            self.extract(body))
+
+    def test_duplicates_and_missing_href(self):
+        body = (b'<html><body><a href="a.html">x</a><a name="top">y</a>'
+                b'<link href="style.css"><a href="a.html">z</a></body></html>')
+        self.assertEqual(
+            ['https://docs.openstack.org/nova/latest/admin/a.html'],
+            self.extract(body))
+
+    def test_unsafe_characters(self):
+        body = u'<a href="caf\xe9 menu.html">x</a>'.encode('utf-8')
+        self.assertEqual(
+            ['https://docs.openstack.org/nova/latest/admin/'
+             'caf%C3%A9%20menu.html'],
+            self.extract(body))
+
+    def test_empty_body(self):
+        self.assertEqual([], self.extract(b''))
+
+    def test_same_links_as_scrapy(self):
+        body = (b'<html><body><a href="a.html#s1">1</a><a href="a.html">2</a>'
+                b'<a href="http://opendev.org/x">3</a><a href="doc.pdf">4</a>'
+                b'<a href="?q=1">5</a><a href="mailto:a@b.c">6</a>'
+                b'</body></html>')
+        response = http.HtmlResponse(URL, body=body, encoding='utf-8')
+        expected = linkextractors.LinkExtractor(
+            deny_extensions=[]).extract_links(response)
+        self.assertEqual([link.url for link in expected], self.extract(body))
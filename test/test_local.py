@@ -0,0 +1,84 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tempfile
+import unittest
+
+from sitemap.generator import local
+from sitemap.generator.spiders import sitemap_file
+
+
+class TestWalkTree(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.spider = sitemap_file.SitemapSpider()
+        for path in ['index.html', 'style.css', 'nova/2026.1/index.html',
+                     'nova/latest/admin guide.html', 'nova/zed/index.html',
+                     'nova/latest/nova.pdf']:
+            path = os.path.join(self.tmpdir.name, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w'):
+                pass
+            os.utime(path, (0, 86400))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_urls(self):
+        items = list(local.walk_tree(self.tmpdir.name, self.spider))
+
+        self.assertEqual(
+            ['https://docs.openstack.org/',
+             'https://docs.openstack.org/nova/2026.1/',
+             'https://docs.openstack.org/nova/latest/admin%20guide.html',
+             'https://docs.openstack.org/nova/latest/nova.pdf'],
+            [item['loc'] for item in items])
+
+    def test_build_directories_are_skipped(self):
+        for path in ['nova/latest/_sources/index.rst.txt',
+                     'nova/latest/_static/jquery.txt']:
+            path = os.path.join(self.tmpdir.name, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w'):
+                pass
+
+        items = list(local.walk_tree(self.tmpdir.name, self.spider))
+
+        self.assertEqual(4, len(items))
+
+    def test_other_files_are_skipped(self):
+        for path in ['.buildinfo', '.htaccess', 'objects.inv', 'README',
+                     'nova/latest/.doctrees/index.html',
+                     'nova/latest/.hidden.html']:
+            path = os.path.join(self.tmpdir.name, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w'):
+                pass
+
+        items = list(local.walk_tree(self.tmpdir.name, self.spider))
+
+        self.assertEqual(4, len(items))
+
+    def test_item_fields(self):
+        items = list(local.walk_tree(self.tmpdir.name, self.spider))
+
+        self.assertEqual('1970-01-02T00:00:00+00:00', items[0]['lastmod'])
+        self.assertEqual(('1.0', 'weekly'),
+                         (items[1]['priority'], items[1]['changefreq']))
+        self.assertEqual(('0.5', 'daily'),
+                         (items[2]['priority'], items[2]['changefreq']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+from unittest import mock
+
+import scrapy
+from scrapy import exceptions
+
+from sitemap.generator import middlewares
+from sitemap.generator.spiders import sitemap_file
+
+
+class TestSitemapRedirectMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.spider = sitemap_file.SitemapSpider()
+        self.spider.url_state = mock.MagicMock()
+        crawler = mock.MagicMock()
+        crawler.spider = self.spider
+        crawler.settings = scrapy.settings.Settings()
+        self.middleware = middlewares.SitemapRedirectMiddleware(
+            crawler.settings)
+        self.middleware.crawler = crawler
+        self.request = scrapy.Request('https://docs.openstack.org/infra/')
+
+    def _redirect(self, location):
+        response = scrapy.http.Response(
+            self.request.url, status=301, headers={'Location': location})
+        return self.middleware.process_response(self.request, response)
+
+    def test_redirect_is_followed(self):
+        redirected = self._redirect('https://docs.openstack.org/infra/a/')
+
+        self.assertEqual('https://docs.openstack.org/infra/a/',
+                         redirected.url)
+        self.spider.url_state.set_redirect.assert_called_once_with(
+            'https://docs.openstack.org/infra/',
+            'https://docs.openstack.org/infra/a/')
+
+    def test_offsite_redirect_is_ignored(self):
+        with self.assertRaises(exceptions.IgnoreRequest):
+            self._redirect('https://docs.opendev.org/')
+
+        self.spider.url_state.set_redirect.assert_called_once_with(
+            'https://docs.openstack.org/infra/', 'https://docs.opendev.org/')
+        self.middleware.crawler.stats.inc_value.assert_any_call(
+            'sitemap/redirects/offsite')
+
+    def test_other_responses_are_returned(self):
+        response = scrapy.http.Response(self.request.url)
+
+        self.assertIs(response, self.middleware.process_response(
+            self.request, response))
+        self.spider.url_state.set_redirect.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,7 +10,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import gzip
+import io
+import os
+import tempfile
+
+from lxml import etree
 from sitemap.generator import pipelines
+from twisted.internet import defer
 import unittest
 from unittest import mock
 
@@ -18,7 +25,7 @@ from unittest import mock
 class TestSitemapItemExporter(unittest.TestCase):
 
     def test_start_exporting(self):
-        output = mock.MagicMock()
+        output = io.BytesIO()
         itemExplorer = pipelines.SitemapItemExporter(output)
 
         with mock.patch.object(itemExplorer.xg, 'startDocument',
@@ -33,47 +40,94 @@ class TestSitemapItemExporter(unittest.TestCase):
 
 class TestIgnoreDuplicateUrls(unittest.TestCase):
 
+    URL = 'https://docs.openstack.org/url'
+
     def setUp(self):
         self.ignore_urls = pipelines.IgnoreDuplicateUrls()
 
-    def test_set_is_set_at_init(self):
-        self.assertIsInstance(self.ignore_urls.processed, set)
+    def test_fingerprints_are_set_per_domain(self):
+        self.assertIsInstance(
+            self.ignore_urls.fingerprints('docs.openstack.org'),
+            pipelines.fingerprints.FingerprintSet)
 
     def test_set_is_empty_at_init(self):
-        self.assertEqual(len(self.ignore_urls.processed), 0)
+        self.assertEqual(self.ignore_urls.processed, {})
 
     def test_duplicate_url(self):
-        self.ignore_urls.processed.add('url')
-        item = {'loc': 'url'}
+        self.ignore_urls.fingerprints('docs.openstack.org').add(self.URL)
+        item = {'loc': self.URL}
         spider = mock.MagicMock()
 
         with self.assertRaises(pipelines.scrapy.exceptions.DropItem):
             self.ignore_urls.process_item(item, spider)
 
     def test_url_added_to_processed(self):
-        self.assertFalse('url' in self.ignore_urls.processed)
+        processed = self.ignore_urls.fingerprints('docs.openstack.org')
+        self.assertFalse(self.URL in processed)
 
-        item = {'loc': 'url'}
+        item = {'loc': self.URL}
         spider = mock.MagicMock()
         self.ignore_urls.process_item(item, spider)
-        self.assertTrue('url' in self.ignore_urls.processed)
+        self.assertTrue(self.URL in processed)
+
+    def test_domains_are_separate(self):
+        spider = mock.MagicMock()
+        self.ignore_urls.process_item({'loc': self.URL}, spider)
+        self.ignore_urls.process_item(
+            {'loc': 'https://developer.openstack.org/url'}, spider)
+
+        self.assertEqual(['developer.openstack.org', 'docs.openstack.org'],
+                         sorted(self.ignore_urls.processed))
+        self.assertEqual(
+            1, len(self.ignore_urls.fingerprints('docs.openstack.org')))
 
     def test_item_is_returned(self):
-        item = {'loc': 'url'}
+        item = {'loc': self.URL}
         spider = mock.MagicMock()
         returned_item = self.ignore_urls.process_item(item, spider)
         self.assertEqual(item, returned_item)
 
+    def test_on_disk_set(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'dedup')
+            ignore_urls = pipelines.IgnoreDuplicateUrls(path)
+            spider = mock.MagicMock()
+            ignore_urls.process_item({'loc': self.URL}, spider)
+
+            self.assertTrue(os.path.exists(path + '.docs.openstack.org'))
+            with self.assertRaises(pipelines.scrapy.exceptions.DropItem):
+                ignore_urls.process_item({'loc': self.URL}, spider)
+
+            ignore_urls.spider_closed(spider)
+            self.assertEqual([], os.listdir(tmpdir))
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            spider = mock.MagicMock()
+            ignore_urls = pipelines.IgnoreDuplicateUrls(jobdir=tmpdir)
+            ignore_urls.spider_opened(spider)
+            ignore_urls.process_item({'loc': self.URL}, spider)
+            ignore_urls.spider_closed(spider, 'shutdown')
+
+            ignore_urls = pipelines.IgnoreDuplicateUrls(jobdir=tmpdir)
+            ignore_urls.spider_opened(spider)
+            with self.assertRaises(pipelines.scrapy.exceptions.DropItem):
+                ignore_urls.process_item({'loc': self.URL}, spider)
+            ignore_urls.spider_closed(spider, 'finished')
+            self.assertEqual([], os.listdir(tmpdir))
+
 
 class TestExportSitemap(unittest.TestCase):
 
     def setUp(self):
         self.export_sitemap = pipelines.ExportSitemap()
         self.spider = mock.MagicMock()
+        self.spider.domains = ['docs.openstack.org']
+        self.spider.shard = None
+        self.item = {'loc': 'https://docs.openstack.org/'}
 
     def test_variables_set_at_init(self):
-        self.assertIsInstance(self.export_sitemap.files, dict)
-        self.assertTrue(self.export_sitemap.exporter is None)
+        self.assertEqual(self.export_sitemap.sitemaps, {})
 
     def test_spider_opened_calls_open(self):
         with mock.patch.object(pipelines, 'open',
@@ -83,14 +137,15 @@ class TestExportSitemap(unittest.TestCase):
 
         self.assertTrue(mocked_open.called)
 
-    def test_spider_opened_assigns_spider(self):
-        prev_len = len(self.export_sitemap.files)
+    def test_spider_opened_adds_sitemap_per_domain(self):
+        self.spider.domains = ['docs.openstack.org',
+                               'developer.openstack.org']
         with mock.patch.object(pipelines, 'open', return_value=None):
             with mock.patch.object(pipelines, 'SitemapItemExporter'):
                 self.export_sitemap.spider_opened(self.spider)
 
-        after_len = len(self.export_sitemap.files)
-        self.assertTrue(after_len - prev_len, 1)
+        self.assertEqual(['developer.openstack.org', 'docs.openstack.org'],
+                         sorted(self.export_sitemap.sitemaps))
 
     def test_spider_opened_instantiates_exporter(self):
         with mock.patch.object(pipelines, 'open', return_value=None):
@@ -101,86 +156,63 @@ class TestExportSitemap(unittest.TestCase):
         self.assertTrue(mocked_exporter.called)
 
     def test_spider_opened_exporter_starts_exporting(self):
-        with mock.patch.object(pipelines, 'open', return_value=None):
+        with mock.patch.object(pipelines, 'open',
+                               return_value=io.BytesIO()):
             with mock.patch.object(pipelines.SitemapItemExporter,
                                    'start_exporting') as mocked_start:
                 self.export_sitemap.spider_opened(self.spider)
 
         self.assertTrue(mocked_start.called)
 
-    def test_spider_closed_calls_finish(self):
-        self.export_sitemap.exporter = mock.MagicMock()
-        self.export_sitemap.exporter.finish_exporting = mock.MagicMock()
-        self.export_sitemap.files[self.spider] = mock.MagicMock()
-
-        with mock.patch.object(pipelines, 'lxml'):
-            with mock.patch.object(pipelines, 'open'):
-                self.export_sitemap.spider_closed(self.spider)
-
-        self.assertTrue(self.export_sitemap.exporter.finish_exporting.called)
+    def _mock_sitemap(self):
+        sitemap = pipelines.DomainSitemap('docs.openstack.org')
+        sitemap.exporter = mock.MagicMock()
+        sitemap.file = mock.MagicMock()
+        sitemap.file.tell.return_value = 0
+        sitemap.shards = [('sitemap.xml', None)]
+        self.export_sitemap.sitemaps['docs.openstack.org'] = sitemap
+        return sitemap
 
-    def test_spider_closed_pops_spider(self):
-        self.export_sitemap.exporter = mock.MagicMock()
-        self.export_sitemap.files[self.spider] = mock.MagicMock()
-
-        self.assertTrue(self.spider in self.export_sitemap.files)
+    def test_spider_closed_calls_finish(self):
+        sitemap = self._mock_sitemap()
 
-        with mock.patch.object(pipelines, 'lxml'):
-            with mock.patch.object(pipelines, 'open'):
-                self.export_sitemap.spider_closed(self.spider)
+        with mock.patch.object(pipelines.os, 'replace'):
+            self.export_sitemap.spider_closed(self.spider)
 
-        self.assertFalse(self.spider in self.export_sitemap.files)
+        self.assertTrue(sitemap.exporter.finish_exporting.called)
 
-    def test_spider_closed_parses_with_lxml(self):
-        self.export_sitemap.exporter = mock.MagicMock()
-        self.export_sitemap.exporter.finish_exporting = mock.MagicMock()
-        self.export_sitemap.files[self.spider] = mock.MagicMock()
+    def test_spider_closed_closes_file(self):
+        sitemap = self._mock_sitemap()
+        output = sitemap.file
 
-        with mock.patch.object(pipelines.lxml, 'etree'):
-            with mock.patch.object(pipelines.lxml.etree,
-                                   'parse') as mocked_lxml_parse:
-                with mock.patch.object(pipelines, 'open'):
-                    self.export_sitemap.spider_closed(self.spider)
+        with mock.patch.object(pipelines.os, 'replace'):
+            self.export_sitemap.spider_closed(self.spider)
 
-        self.assertTrue(mocked_lxml_parse.called)
+        self.assertTrue(output.close.called)
+        self.assertIsNone(sitemap.file)
 
-    def test_spider_closed_opens_xml_files(self):
-        self.export_sitemap.exporter = mock.MagicMock()
-        self.export_sitemap.exporter.finish_exporting = mock.MagicMock()
-        self.export_sitemap.files[self.spider] = mock.MagicMock()
+    def test_spider_closed_does_not_read_back(self):
+        self._mock_sitemap()
 
-        with mock.patch.object(pipelines, 'lxml'):
-            with mock.patch.object(pipelines, 'open') as mocked_open:
+        with mock.patch.object(pipelines, 'open') as mocked_open:
+            with mock.patch.object(pipelines.os, 'replace') as mocked_replace:
                 self.export_sitemap.spider_closed(self.spider)
 
-        self.assertTrue(mocked_open.called)
-
-    def test_spider_closed_writes_tree(self):
-        self.export_sitemap.exporter = mock.MagicMock()
-        self.export_sitemap.exporter.finish_exporting = mock.MagicMock()
-        self.export_sitemap.files[self.spider] = mock.MagicMock()
-
-        with mock.patch.object(pipelines.lxml, 'etree'):
-            with mock.patch.object(pipelines.lxml.etree,
-                                   'tostring') as mocked_lxml_tostring:
-                with mock.patch.object(pipelines, 'open'):
-                    self.export_sitemap.spider_closed(self.spider)
-
-        self.assertTrue(mocked_lxml_tostring.called)
+        self.assertFalse(mocked_open.called)
+        self.assertTrue(mocked_replace.called)
 
     def test_process_item_exports_item(self):
-        item = spider = self.export_sitemap.exporter = mock.MagicMock()
-        self.export_sitemap.exporter.export_item = mock.MagicMock()
-        self.export_sitemap.process_item(item, spider)
+        sitemap = self._mock_sitemap()
+        self.export_sitemap.process_item(self.item, self.spider)
 
-        self.assertTrue(self.export_sitemap.exporter.export_item.called)
+        sitemap.exporter.export_item.assert_called_once_with(self.item)
 
     def test_process_item_returns_item(self):
-        spider = self.export_sitemap.exporter = mock.MagicMock()
-        item = {'random': 'item'}
-        returned_item = self.export_sitemap.process_item(item, spider)
+        self._mock_sitemap()
+        returned_item = self.export_sitemap.process_item(self.item,
+                                                         self.spider)
 
-        self.assertEqual(item, returned_item)
+        self.assertEqual(self.item, returned_item)
 
     def test_from_crawler_exists(self):
         attr_exists = hasattr(pipelines.ExportSitemap, 'from_crawler')
@@ -194,5 +226,280 @@ class TestExportSitemap(unittest.TestCase):
         # still thinking how to go about here.
 
 
+class TestBackgroundWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.written = []
+
+    def test_order_is_kept(self):
+        writer = pipelines.BackgroundWriter(self.written.extend,
+                                            queue_size=2, batch_size=3)
+        results = [writer.put(i) for i in range(20)]
+        writer.close()
+
+        self.assertEqual(list(range(20)), self.written)
+        self.assertIn(0, results)
+        fired = []
+        for result in results:
+            if isinstance(result, defer.Deferred):
+                result.addCallback(fired.append)
+        self.assertEqual([i for i, result in enumerate(results)
+                          if isinstance(result, defer.Deferred)], fired)
+
+    def test_write_timing_is_added_at_close(self):
+        stats = mock.MagicMock()
+        stats.get_value.return_value = None
+        writer = pipelines.BackgroundWriter(self.written.extend,
+                                            batch_size=1, stats=stats)
+        writer.put(1)
+        writer.put(2)
+        writer.thread.join(0.1)
+        stats.set_value.assert_not_called()
+
+        writer.close()
+
+        key, histogram = stats.set_value.call_args[0]
+        self.assertEqual('sitemap/timing/export_write', key)
+        self.assertEqual(2, histogram.count)
+
+    def test_errors_are_raised_at_close(self):
+        def fail(items):
+            raise OSError('No space left on device')
+
+        writer = pipelines.BackgroundWriter(fail)
+        writer.put(1)
+        with self.assertRaises(OSError):
+            writer.close()
+
+
+class TestExportSitemapShards(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.spider = mock.MagicMock()
+        self.spider.domain = 'docs.openstack.org'
+        self.spider.domains = ['docs.openstack.org']
+        self.spider.shard = None
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def _crawl(self, pipeline, count):
+        pipeline.spider_opened(self.spider)
+        for i in range(count):
+            pipeline.process_item(
+                {'loc': 'https://docs.openstack.org/%d.html' % i},
+                self.spider)
+        pipeline.spider_closed(self.spider)
+
+    def test_single_shard_is_renamed(self):
+        self._crawl(pipelines.ExportSitemap(max_urls=10), 10)
+
+        self.assertEqual(['sitemap_docs.openstack.org.xml'],
+                         os.listdir('.'))
+
+    def test_output_is_indented(self):
+        self._crawl(pipelines.ExportSitemap(), 1)
+
+        with open('sitemap_docs.openstack.org.xml') as sitemap:
+            lines = sitemap.read().splitlines()
+        self.assertEqual('  <url>', lines[2])
+        self.assertEqual('    <loc>https://docs.openstack.org/0.html</loc>',
+                         lines[3])
+        self.assertEqual('</urlset>', lines[-1])
+
+    def test_rolls_over_on_url_count(self):
+        self._crawl(pipelines.ExportSitemap(max_urls=10), 25)
+
+        self.assertEqual(['sitemap_docs.openstack.org-0001.xml',
+                          'sitemap_docs.openstack.org-0002.xml',
+                          'sitemap_docs.openstack.org-0003.xml',
+                          'sitemap_docs.openstack.org-index.xml'],
+                         sorted(os.listdir('.')))
+        tree = etree.parse(
+            'sitemap_docs.openstack.org-0003.xml')
+        self.assertEqual(5, len(tree.getroot()))
+
+    def test_rolls_over_on_size(self):
+        pipeline = pipelines.ExportSitemap(
+            max_bytes=pipelines.MAX_ENTRY_SIZE + 1024)
+        self._crawl(pipeline, 30)
+
+        shards = pipeline.sitemaps['docs.openstack.org'].shards
+        self.assertGreater(len(shards), 1)
+        for path, lastmod in shards:
+            self.assertLessEqual(os.path.getsize(path),
+                                 pipelines.MAX_ENTRY_SIZE + 1024)
+
+    def test_compressed_output(self):
+        self._crawl(pipelines.ExportSitemap(max_urls=10, compress=True), 15)
+
+        self.assertEqual(['sitemap_docs.openstack.org-0001.xml.gz',
+                          'sitemap_docs.openstack.org-0002.xml.gz',
+                          'sitemap_docs.openstack.org-index.xml'],
+                         sorted(os.listdir('.')))
+        with gzip.open('sitemap_docs.openstack.org-0002.xml.gz') as shard:
+            tree = etree.parse(shard)
+        self.assertEqual(5, len(tree.getroot()))
+
+    def _resume(self, compress):
+        jobdir = os.path.join(self.tmpdir.name, 'job')
+        pipeline = pipelines.ExportSitemap(max_urls=10, compress=compress,
+                                           jobdir=jobdir)
+        pipeline.spider_opened(self.spider)
+        for i in range(15):
+            pipeline.process_item(
+                {'loc': 'https://docs.openstack.org/%d.html' % i},
+                self.spider)
+        pipeline.spider_closed(self.spider, 'shutdown')
+        self.assertTrue(os.path.exists(os.path.join(jobdir,
+                                                    'sitemap-export.json')))
+
+        pipeline = pipelines.ExportSitemap(max_urls=10, compress=compress,
+                                           jobdir=jobdir)
+        pipeline.spider_opened(self.spider)
+        for i in range(15, 25):
+            pipeline.process_item(
+                {'loc': 'https://docs.openstack.org/%d.html' % i},
+                self.spider)
+        pipeline.spider_closed(self.spider, 'finished')
+        self.assertEqual([], os.listdir(jobdir))
+
+    def test_jobdir_is_created_by_checkpoint(self):
+        jobdir = os.path.join(self.tmpdir.name, 'job')
+        pipeline = pipelines.ExportSitemap(jobdir=jobdir)
+        pipeline.spider_opened(self.spider)
+        self.assertFalse(os.path.exists(jobdir))
+
+        pipeline.spider_closed(self.spider, 'shutdown')
+        self.assertTrue(os.path.exists(os.path.join(jobdir,
+                                                    'sitemap-export.json')))
+
+    def _locs(self, path):
+        tree = etree.parse(path)
+        return [e.text for e in tree.iter('{%s}loc' % pipelines.SITEMAP_NS)]
+
+    def test_resume(self):
+        self._resume(compress=False)
+
+        self.assertEqual(['https://docs.openstack.org/%d.html' % i
+                          for i in range(10, 20)],
+                         self._locs('sitemap_docs.openstack.org-0002.xml'))
+        self.assertEqual(['https://docs.openstack.org/%d.html' % i
+                          for i in range(20, 25)],
+                         self._locs('sitemap_docs.openstack.org-0003.xml'))
+
+    def test_resume_compressed(self):
+        self._resume(compress=True)
+
+        with gzip.open('sitemap_docs.openstack.org-0002.xml.gz') as shard:
+            self.assertEqual(['https://docs.openstack.org/%d.html' % i
+                              for i in range(10, 20)],
+                             self._locs(shard))
+
+    def test_interrupted_shard_is_valid(self):
+        pipeline = pipelines.ExportSitemap(jobdir='job')
+        pipeline.spider_opened(self.spider)
+        pipeline.process_item({'loc': 'https://docs.openstack.org/'},
+                              self.spider)
+        pipeline.spider_closed(self.spider, 'shutdown')
+
+        self.assertEqual(['https://docs.openstack.org/'],
+                         self._locs('sitemap_docs.openstack.org-0001.xml'))
+
+    def test_index_lists_shards(self):
+        pipeline = pipelines.ExportSitemap(
+            max_urls=10, base_url='https://example.org/sitemaps/')
+        self._crawl(pipeline, 15)
+
+        tree = etree.parse('sitemap_docs.openstack.org-index.xml')
+        locs = [e.text for e in tree.iter(
+            '{%s}loc' % pipelines.SITEMAP_NS)]
+        self.assertEqual(
+            ['https://example.org/sitemaps/'
+             'sitemap_docs.openstack.org-0001.xml',
+             'https://example.org/sitemaps/'
+             'sitemap_docs.openstack.org-0002.xml'], locs)
+
+    def test_partial_sitemap(self):
+        self.spider.shard = (2, 3)
+        self._crawl(pipelines.ExportSitemap(max_urls=10), 15)
+
+        self.assertEqual(
+            ['sitemap_docs.openstack.org.part-2-of-3-0001.xml',
+             'sitemap_docs.openstack.org.part-2-of-3-0002.xml',
+             'sitemap_docs.openstack.org.part-2-of-3-index.xml'],
+            sorted(os.listdir('.')))
+
+    def test_export(self):
+        pipeline = pipelines.ExportSitemap(max_urls=10)
+        pipeline.export(self.spider, (
+            {'loc': 'https://docs.openstack.org/%d.html' % i}
+            for i in range(3)))
+
+        self.assertEqual(['https://docs.openstack.org/%d.html' % i
+                          for i in range(3)],
+                         self._locs('sitemap_docs.openstack.org.xml'))
+
+    def test_background_writer(self):
+        pipeline = pipelines.ExportSitemap(max_urls=10, queue_size=4)
+        self._crawl(pipeline, 25)
+
+        self.assertEqual(
+            ['https://docs.openstack.org/%d.html' % i for i in range(20, 25)],
+            self._locs('sitemap_docs.openstack.org-0003.xml'))
+        self.assertIsNone(pipeline.writer)
+
+    def test_time_budget_writes_complete_sitemap(self):
+        pipeline = pipelines.ExportSitemap(jobdir='job')
+        pipeline.spider_opened(self.spider)
+        pipeline.process_item({'loc': 'https://docs.openstack.org/'},
+                              self.spider)
+        pipeline.spider_closed(self.spider, 'time_budget')
+
+        self.assertEqual(['https://docs.openstack.org/'],
+                         self._locs('sitemap_docs.openstack.org.xml'))
+        self.assertFalse(os.path.exists('job/sitemap-export.json'))
+
+    def test_sitemap_per_domain(self):
+        self.spider.domains = ['docs.openstack.org',
+                               'developer.openstack.org']
+        pipeline = pipelines.ExportSitemap()
+        pipeline.spider_opened(self.spider)
+        for domain in ('docs.openstack.org', 'developer.openstack.org',
+                       'docs.openstack.org'):
+            pipeline.process_item({'loc': 'https://%s/' % domain},
+                                  self.spider)
+        pipeline.spider_closed(self.spider)
+
+        self.assertEqual(['https://docs.openstack.org/'] * 2,
+                         self._locs('sitemap_docs.openstack.org.xml'))
+        self.assertEqual(['https://developer.openstack.org/'],
+                         self._locs('sitemap_developer.openstack.org.xml'))
+
+    def test_resume_per_domain(self):
+        self.spider.domains = ['docs.openstack.org',
+                               'developer.openstack.org']
+        pipeline = pipelines.ExportSitemap(jobdir='job')
+        pipeline.spider_opened(self.spider)
+        pipeline.process_item({'loc': 'https://docs.openstack.org/'},
+                              self.spider)
+        pipeline.spider_closed(self.spider, 'shutdown')
+
+        pipeline = pipelines.ExportSitemap(jobdir='job')
+        pipeline.spider_opened(self.spider)
+        pipeline.process_item({'loc': 'https://developer.openstack.org/'},
+                              self.spider)
+        pipeline.spider_closed(self.spider)
+
+        self.assertEqual(['https://docs.openstack.org/'],
+                         self._locs('sitemap_docs.openstack.org.xml'))
+        self.assertEqual(['https://developer.openstack.org/'],
+                         self._locs('sitemap_developer.openstack.org.xml'))
+
+
 if __name__ == '__main__':
     unittest.main()
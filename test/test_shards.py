@@ -0,0 +1,107 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import functools
+import http.server
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from sitemap.generator import sitemaps
+from sitemap.generator.spiders import sitemap_file
+
+SITEMAP_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                           'sitemap')
+PROJECTS = ['p%d' % i for i in range(1, 9)]
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestShardedCrawl(unittest.TestCase):
+    '''Crawl a site whose projects are only linked from a hub page.'''
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        root = os.path.join(self.tmpdir.name, 'site')
+        pages = {'index.html': ['hub/'],
+                 'hub/index.html': ['../%s/' % name for name in PROJECTS]}
+        for name in PROJECTS:
+            pages['%s/index.html' % name] = ['page.html']
+            pages['%s/page.html' % name] = ['index.html']
+        for path, links in pages.items():
+            path = os.path.join(root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as page:
+                page.write(''.join('<a href="%s">%s</a>' % (link, link)
+                                   for link in links))
+        handler = functools.partial(QuietHandler, directory=root)
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      handler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.domain = '127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def _crawl(self, output, *args):
+        os.makedirs(output, exist_ok=True)
+        env = dict(os.environ, SCRAPY_SETTINGS_MODULE='generator.settings',
+                   PYTHONPATH=SITEMAP_DIR)
+        command = [sys.executable, '-m', 'scrapy', 'crawl', 'sitemap',
+                   '-a', 'domain=' + self.domain, '-a', 'scheme=http',
+                   '-s', 'LOG_LEVEL=WARNING', '-s', 'ROBOTSTXT_OBEY=False',
+                   '-s', 'SITEMAP_LINK_REPORT=True']
+        return subprocess.Popen(command + list(args), cwd=output, env=env)
+
+    def _locs(self, *paths):
+        return [entry['loc'] for entry in sitemaps.merge(paths)]
+
+    def test_merged_shards_equal_unsharded_crawl(self):
+        hub = 'http://%s/hub/' % self.domain
+        owners = set(sitemap_file.shard_of('http://%s/%s/' % (self.domain,
+                                                              name), 2)
+                     for name in PROJECTS)
+        # Projects of the other shard are only reachable through the hub
+        self.assertEqual({1, 2}, owners)
+
+        output = os.path.join(self.tmpdir.name, 'output')
+        shard_dir = os.path.join(self.tmpdir.name, 'shards')
+        crawls = [self._crawl(os.path.join(self.tmpdir.name, 'full'))]
+        crawls += [self._crawl(output, '-a', 'shard=%d/2' % index,
+                               '-s', 'SITEMAP_SHARD_DIR=' + shard_dir)
+                   for index in (1, 2)]
+        for crawl in crawls:
+            self.assertEqual(0, crawl.wait(120))
+
+        full = self._locs(os.path.join(self.tmpdir.name, 'full',
+                                       'sitemap_%s.xml' % self.domain))
+        self.assertIn(hub, full)
+        self.assertEqual(1 + 2 * len(PROJECTS), len(full))
+        parts = [os.path.join(output, 'sitemap_%s.part-%d-of-2.xml'
+                              % (self.domain, index)) for index in (1, 2)]
+        self.assertEqual(full, self._locs(*parts))
+        # Every process writes its own reports
+        for index in (1, 2):
+            for suffix in ('report.json', 'links.json'):
+                self.assertTrue(os.path.exists(os.path.join(
+                    output, 'sitemap_%s.part-%d-of-2.%s'
+                    % (self.domain, index, suffix))))
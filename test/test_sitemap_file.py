@@ -10,7 +10,13 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import json
+import os
+import tempfile
+
 import scrapy
+from scrapy.utils.test import get_crawler
+from sitemap.generator import linkgraph
 from sitemap.generator.spiders import sitemap_file
 import unittest
 from unittest import mock
@@ -34,6 +40,14 @@ class TestSitemapItem(unittest.TestCase):
             with self.assertRaises(KeyError):
                 a[field] = field
 
+    def test_from_entry_ignores_unknown_fields(self):
+        item = sitemap_file.SitemapItem.from_entry(
+            {'loc': 'https://docs.openstack.org/', 'lastmod': '2024-01-01',
+             'image': 'logo.png'})
+
+        self.assertEqual({'loc': 'https://docs.openstack.org/',
+                          'lastmod': '2024-01-01'}, dict(item))
+
 
 class TestSitemapSpider(unittest.TestCase):
 
@@ -46,6 +60,72 @@ class TestSitemapSpider(unittest.TestCase):
         self.assertEqual(self.spider.allowed_domains, [domain])
         self.assertEqual(self.spider.start_urls, ['https://%s' % domain])
 
+    def test_several_domains(self):
+        spider = sitemap_file.SitemapSpider(
+            domain='docs.openstack.org, developer.openstack.org')
+
+        self.assertEqual('docs.openstack.org', spider.domain)
+        self.assertEqual(['docs.openstack.org', 'developer.openstack.org'],
+                         spider.allowed_domains)
+        self.assertEqual(['https://docs.openstack.org',
+                          'https://developer.openstack.org'],
+                         spider.start_urls)
+
+    def test_domain_with_port(self):
+        spider = sitemap_file.SitemapSpider(domain='localhost:8080',
+                                            scheme='http')
+
+        self.assertEqual(['localhost'], spider.allowed_domains)
+        self.assertEqual(['http://localhost:8080'], spider.start_urls)
+
+    def test_invalid_shard(self):
+        for shard in ('3/2', '0/2', 'a/b', '1'):
+            with self.assertRaises(ValueError):
+                sitemap_file.SitemapSpider(shard=shard)
+
+    def test_shards_partition_urls(self):
+        urls = ['https://docs.openstack.org/%s/latest/%s' % (project, page)
+                for project in ('nova', 'neutron', 'glance', 'cinder',
+                                'swift', 'keystone', 'ironic', 'heat')
+                for page in ('', 'index.html', 'admin/index.html')]
+        spiders = [sitemap_file.SitemapSpider(shard='%d/3' % i)
+                   for i in (1, 2, 3)]
+
+        owners = [[spider.in_shard(url) for spider in spiders]
+                  for url in urls]
+        self.assertTrue(all(sum(owner) == 1 for owner in owners))
+        # all pages of a project are in the same shard
+        for i in range(0, len(urls), 3):
+            self.assertEqual(owners[i], owners[i + 1])
+            self.assertEqual(owners[i], owners[i + 2])
+        self.assertTrue(all(any(column) for column in zip(*owners)))
+
+    def test_links_of_other_shards_are_handed_over(self):
+        spider = sitemap_file.SitemapSpider(shard='1/2')
+        spider.handoff = mock.MagicMock()
+        projects = ('nova', 'neutron', 'glance', 'cinder')
+        response = scrapy.http.HtmlResponse(
+            'https://docs.openstack.org/', encoding='utf-8',
+            body=''.join('<a href="/%s/latest/">%s</a>' % (project, project)
+                         for project in projects).encode('utf-8'))
+        urls = ['https://docs.openstack.org/%s/latest/' % project
+                for project in projects]
+
+        requests = spider._requests_to_follow(response)
+
+        self.assertEqual([url for url in urls if spider.in_shard(url)],
+                         [request.url for request in requests])
+        self.assertEqual(
+            [mock.call(2, url, 'https://docs.openstack.org/')
+             for url in urls if not spider.in_shard(url)],
+            spider.handoff.send.call_args_list)
+
+    def test_shard_needs_shard_dir(self):
+        crawler = get_crawler(sitemap_file.SitemapSpider)
+
+        with self.assertRaises(ValueError):
+            sitemap_file.SitemapSpider.from_crawler(crawler, shard='1/2')
+
     def test_start_urls_get_appended(self):
         urls = 'new.openstack.org, old.openstack.org'
         urls_len = len(urls.split(','))
@@ -61,10 +141,11 @@ class TestSitemapSpider(unittest.TestCase):
         path = sitemap_file.urlparse.SplitResult(
             scheme='https',
             netloc='docs.openstack.org',
-            path='/2024.1/something.html',
+            path='/2026.1/something.html',
             query='',
             fragment=''
         )
+        response.url = path.geturl()
         with mock.patch.object(sitemap_file,
                                'SitemapItem') as mocked_sitemap_item:
             with mock.patch.object(sitemap_file.urlparse, 'urlsplit',
@@ -79,10 +160,11 @@ class TestSitemapSpider(unittest.TestCase):
         path = sitemap_file.urlparse.SplitResult(
             scheme='https',
             netloc='docs.openstackorg',
-            path='/2024.1/something.html',
+            path='/2026.1/something.html',
             query='',
             fragment=''
         )
+        response.url = path.geturl()
         with mock.patch.object(sitemap_file, 'SitemapItem'):
             with mock.patch.object(sitemap_file.urlparse,
                                    'urlsplit',
@@ -101,6 +183,7 @@ class TestSitemapSpider(unittest.TestCase):
             query='',
             fragment=''
         )
+        response.url = path.geturl()
         with mock.patch.object(sitemap_file.urlparse, 'urlsplit',
                                return_value=path):
             with mock.patch.object(sitemap_file, 'time'):
@@ -118,6 +201,7 @@ class TestSitemapSpider(unittest.TestCase):
             query='',
             fragment=''
         )
+        response.url = path.geturl()
         with mock.patch.object(sitemap_file.urlparse, 'urlsplit',
                                return_value=path):
             with mock.patch.object(sitemap_file, 'time'):
@@ -131,10 +215,11 @@ class TestSitemapSpider(unittest.TestCase):
         path = sitemap_file.urlparse.SplitResult(
             scheme='https',
             netloc='docs.openstack.org',
-            path='/2024.1',
+            path='/2026.1',
             query='',
             fragment=''
         )
+        response.url = path.geturl()
         with mock.patch.object(sitemap_file.urlparse, 'urlsplit',
                                return_value=path):
             with mock.patch.object(sitemap_file, 'time'):
@@ -142,6 +227,330 @@ class TestSitemapSpider(unittest.TestCase):
 
         self.assertEqual(4, len(returned_item))
 
+    def test_filter_links(self):
+        links = [scrapy.link.Link('https://docs.openstack.org/nova/latest/'),
+                 scrapy.link.Link('https://docs.openstack.org/nova/zed/'),
+                 scrapy.link.Link('https://opendev.org/openstack/nova')]
+
+        self.assertEqual(links[:1], self.spider.filter_links(links))
+
+    def test_filter_links_requests_canonical_urls(self):
+        self.spider.crawler = mock.MagicMock()
+        links = [scrapy.link.Link('https://docs.openstack.org/nova/latest/'),
+                 scrapy.link.Link(
+                     'https://docs.openstack.org/nova/latest/index.html'),
+                 scrapy.link.Link(
+                     'https://docs.openstack.org/nova/latest#install'),
+                 scrapy.link.Link('https://docs.openstack.org/nova/zed')]
+
+        self.assertEqual(['https://docs.openstack.org/nova/latest/'] * 3,
+                         [link.url
+                          for link in self.spider.filter_links(links)])
+        self.spider.crawler.stats.set_value.assert_called_with(
+            'sitemap/canonical/saved_requests', 2)
+
+    def test_filter_links_skips_known_redirects(self):
+        self.spider.crawler = mock.MagicMock()
+        self.spider.redirects = {
+            'https://docs.openstack.org/nova/': (
+                'https://docs.openstack.org/nova/latest/'),
+            'https://docs.openstack.org/infra/': 'https://docs.opendev.org/',
+        }
+        links = [scrapy.link.Link('https://docs.openstack.org/nova/'),
+                 scrapy.link.Link('https://docs.openstack.org/nova'),
+                 scrapy.link.Link('https://docs.openstack.org/infra/')]
+
+        self.assertEqual(['https://docs.openstack.org/nova/latest/'] * 2,
+                         [link.url
+                          for link in self.spider.filter_links(links)])
+        self.assertEqual(
+            [mock.call('sitemap/redirects/saved_requests', 1)] * 2,
+            self.spider.crawler.stats.inc_value.call_args_list)
+
+    def test_redirect_chain(self):
+        self.spider.redirects = {
+            'https://docs.openstack.org/a/': 'https://docs.openstack.org/b/',
+            'https://docs.openstack.org/b/': 'https://docs.openstack.org/a/',
+        }
+
+        self.assertEqual(
+            'https://docs.openstack.org/a/',
+            self.spider.resolve_redirect('https://docs.openstack.org/a/'))
+
+    def test_maintained_pages_are_requested_first(self):
+        maintained = self.spider.prepare_request(scrapy.Request(
+            'https://docs.openstack.org/nova/2026.1/'))
+        latest = self.spider.prepare_request(scrapy.Request(
+            'https://docs.openstack.org/nova/latest/'))
+        unversioned = self.spider.prepare_request(scrapy.Request(
+            'https://docs.openstack.org/contributor-guide/'))
+
+        self.assertGreater(maintained.priority, latest.priority)
+        self.assertGreater(latest.priority, unversioned.priority)
+
+    def test_links_are_added_to_link_graph(self):
+        self.spider.link_graph = linkgraph.LinkGraph()
+        response = scrapy.http.HtmlResponse(
+            'https://docs.openstack.org/nova/latest/',
+            body=b'<a href="install/index.html">Install</a>'
+                 b'<a href="install/">Install</a>'
+                 b'<a href="/nova/zed/">Zed</a>',
+            encoding='utf-8')
+
+        self.spider._requests_to_follow(response)
+
+        self.assertEqual(
+            [('https://docs.openstack.org/nova/latest/',
+              'https://docs.openstack.org/nova/latest/install/')],
+            [(self.spider.link_graph.urls[source],
+              self.spider.link_graph.urls[target])
+             for source, target in zip(self.spider.link_graph.sources,
+                                       self.spider.link_graph.targets)])
+
+    def test_links_are_stored(self):
+        self.spider.url_state = mock.MagicMock()
+        response = scrapy.http.HtmlResponse(
+            'https://docs.openstack.org/nova/latest/',
+            body=b'<a href="install/">Install</a>', encoding='utf-8')
+
+        self.spider._requests_to_follow(response)
+
+        self.spider.url_state.set_links.assert_called_once_with(
+            'https://docs.openstack.org/nova/latest/',
+            ['https://docs.openstack.org/nova/latest/install/'])
+
+    def test_not_modified_page_follows_stored_links(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.get_links.return_value = [
+            'https://docs.openstack.org/nova/latest/install/',
+            'https://docs.openstack.org/nova/zed/']
+        self.spider.link_graph = linkgraph.LinkGraph()
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/nova/latest/', status=304)
+
+        requests = self.spider._requests_to_follow(response)
+
+        self.assertEqual(['https://docs.openstack.org/nova/latest/install/'],
+                         [request.url for request in requests])
+        self.assertEqual(2, len(self.spider.link_graph))
+        self.spider.url_state.set_links.assert_not_called()
+
+    def test_follows_url(self):
+        self.assertTrue(self.spider.follows_url(
+            'https://docs.openstack.org/nova/latest/'))
+        self.assertFalse(self.spider.follows_url(
+            'https://docs.openstack.org/nova/zed/'))
+        self.assertFalse(self.spider.follows_url('https://opendev.org/'))
+
+    def test_parse_item_uses_canonical_url(self):
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/nova/latest/index.html',
+            headers={'Date': 'Fri, 16 Oct 2026 10:00:00 GMT'})
+
+        self.assertEqual('https://docs.openstack.org/nova/latest/',
+                         self.spider.parse_item(response)['loc'])
+
+    def test_parse_item_ignores_denied_url(self):
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/nova/zed/index.html',
+            headers={'Date': 'Fri, 16 Oct 2026 10:00:00 GMT'})
+
+        self.assertIsNone(self.spider.parse_item(response))
+
+    def test_prepare_request_uses_head_for_pdf(self):
+        request = scrapy.Request('https://docs.openstack.org/nova/nova.pdf')
+
+        request = self.spider.prepare_request(request)
+
+        self.assertEqual('HEAD', request.method)
+        self.assertIn(405, request.meta['handle_httpstatus_list'])
+
+    def test_prepare_request_uses_get_for_html(self):
+        request = scrapy.Request('https://docs.openstack.org/nova/')
+
+        request = self.spider.prepare_request(request)
+
+        self.assertEqual('GET', request.method)
+        self.assertNotIn('handle_httpstatus_list', request.meta)
+
+    def test_parse_item_head_not_allowed(self):
+        request = scrapy.Request('https://docs.openstack.org/nova/nova.pdf',
+                                 method='HEAD')
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/nova/nova.pdf', status=405,
+            request=request)
+
+        retry = self.spider.parse_item(response)
+
+        self.assertEqual('GET', retry.method)
+        self.assertTrue(retry.dont_filter)
+        self.assertTrue(retry.meta['sitemap_headers_only'])
+
+    def test_headers_received_stops_download(self):
+        request = scrapy.Request('https://docs.openstack.org/nova/nova.pdf',
+                                 meta={'sitemap_headers_only': True})
+
+        with self.assertRaises(sitemap_file.exceptions.StopDownload):
+            self.spider.headers_received({}, 0, request, self.spider)
+        self.spider.headers_received({}, 0, scrapy.Request(request.url),
+                                     self.spider)
+
+    def test_add_conditional_headers(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.get.return_value = sitemap_file.state.UrlState(
+            '"abc"', 'Mon, 12 Oct 2026 10:00:00 GMT',
+            '2026-10-12T10:00:00+00:00')
+        request = scrapy.Request('https://docs.openstack.org/')
+
+        request = self.spider.add_conditional_headers(request)
+
+        self.assertEqual(b'"abc"', request.headers['If-None-Match'])
+        self.assertEqual(b'Mon, 12 Oct 2026 10:00:00 GMT',
+                         request.headers['If-Modified-Since'])
+
+    def test_add_conditional_headers_unknown_url(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.get.return_value = None
+        request = scrapy.Request('https://docs.openstack.org/')
+
+        request = self.spider.add_conditional_headers(request)
+
+        self.assertNotIn('If-None-Match', request.headers)
+        self.assertNotIn('If-Modified-Since', request.headers)
+
+    def test_start_requests_seeds_known_urls(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.urls.return_value = [
+            'https://docs.openstack.org/2026.1/']
+        self.spider.url_state.get.return_value = None
+
+        requests = list(self.spider.start_requests())
+
+        self.assertEqual(['https://docs.openstack.org',
+                          'https://docs.openstack.org/2026.1/'],
+                         [r.url for r in requests])
+        self.assertTrue(requests[1].meta['sitemap_seed'])
+
+    def test_start_requests_seeds_sitemap(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.xml') as sitemap:
+            sitemap.write(
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                '<url><loc>https://docs.openstack.org/nova/latest/</loc></url>'
+                '<url><loc>https://docs.openstack.org/nova/zed/</loc></url>'
+                '</urlset>')
+            sitemap.flush()
+            spider = sitemap_file.SitemapSpider(seed=sitemap.name)
+
+            requests = list(spider.start_requests())
+
+        self.assertEqual(['https://docs.openstack.org',
+                          'https://docs.openstack.org/nova/latest/'],
+                         [r.url for r in requests])
+        self.assertTrue(requests[1].meta['sitemap_seed'])
+        self.assertFalse(requests[1].dont_filter)
+
+    def test_parse_item_not_modified_keeps_lastmod(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.get.return_value = sitemap_file.state.UrlState(
+            '"abc"', None, '2026-10-12T10:00:00+00:00')
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/2026.1/', status=304,
+            headers={'Date': 'Fri, 16 Oct 2026 10:00:00 GMT'})
+
+        returned_item = self.spider.parse_item(response)
+
+        self.assertEqual('2026-10-12T10:00:00+00:00', returned_item['lastmod'])
+        self.assertFalse(self.spider.url_state.set.called)
+
+    def test_parse_item_not_modified_is_seen(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.get.return_value = sitemap_file.state.UrlState(
+            '"abc"', None, '2026-10-12T10:00:00+00:00')
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/2026.1/', status=304,
+            headers={'Date': 'Fri, 16 Oct 2026 10:00:00 GMT'})
+
+        self.spider.parse_item(response)
+
+        self.spider.url_state.touch.assert_called_once_with(
+            'https://docs.openstack.org/2026.1/')
+
+    def test_parse_item_stores_state(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.get.return_value = None
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/2026.1/',
+            headers={'ETag': '"abc"',
+                     'Last-Modified': 'Mon, 12 Oct 2026 10:00:00 GMT'},
+            body=b'<html></html>')
+
+        returned_item = self.spider.parse_item(response)
+
+        self.spider.url_state.set.assert_called_once_with(
+            'https://docs.openstack.org/2026.1/', '"abc"',
+            'Mon, 12 Oct 2026 10:00:00 GMT', returned_item['lastmod'],
+            sitemap_file.hashlib.blake2b(b'<html></html>',
+                                         digest_size=16).hexdigest())
+
+    def test_parse_item_same_content_keeps_lastmod(self):
+        content_hash = sitemap_file.hashlib.blake2b(
+            b'<html></html>', digest_size=16).hexdigest()
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.get.return_value = sitemap_file.state.UrlState(
+            '"abc"', 'Mon, 12 Oct 2026 10:00:00 GMT',
+            '2026-10-12T10:00:00+00:00', content_hash)
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/2026.1/',
+            headers={'ETag': '"def"',
+                     'Last-Modified': 'Fri, 16 Oct 2026 10:00:00 GMT'},
+            body=b'<html></html>')
+
+        returned_item = self.spider.parse_item(response)
+
+        self.assertEqual('2026-10-12T10:00:00+00:00', returned_item['lastmod'])
+        self.spider.url_state.set.assert_called_once_with(
+            'https://docs.openstack.org/2026.1/', '"def"',
+            'Fri, 16 Oct 2026 10:00:00 GMT', '2026-10-12T10:00:00+00:00',
+            content_hash)
+
+    def test_parse_item_changed_content_updates_lastmod(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.get.return_value = sitemap_file.state.UrlState(
+            '"abc"', 'Mon, 12 Oct 2026 10:00:00 GMT',
+            '2026-10-12T10:00:00+00:00', 'old')
+        response = scrapy.http.Response(
+            'https://docs.openstack.org/2026.1/',
+            headers={'Last-Modified': 'Fri, 16 Oct 2026 10:00:00 GMT'},
+            body=b'<html></html>')
+
+        returned_item = self.spider.parse_item(response)
+
+        self.assertTrue(returned_item['lastmod'].startswith('2026-10-16'))
+
+    def test_write_delta(self):
+        self.spider.url_state = mock.MagicMock()
+        self.spider.url_state.changes.return_value = [
+            ('added', 'https://docs.openstack.org/a.html', 'x'),
+            ('removed', 'https://docs.openstack.org/b.html', 'y'),
+            ('removed', 'https://developer.openstack.org/c.html', 'z')]
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.chdir(tmpdir)
+            try:
+                removed = self.spider.write_delta()
+                with open('sitemap_docs.openstack.org.delta.jsonl') as delta:
+                    changes = [json.loads(line) for line in delta]
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(['https://docs.openstack.org/b.html'], removed)
+        self.assertEqual(
+            [{'change': 'added', 'url': 'https://docs.openstack.org/a.html',
+              'lastmod': 'x'},
+             {'change': 'removed',
+              'url': 'https://docs.openstack.org/b.html', 'lastmod': 'y'}],
+            changes)
+
 
 if __name__ == '__main__':
     unittest.main()
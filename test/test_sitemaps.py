@@ -0,0 +1,97 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sitemap.generator import pipelines
+from sitemap.generator import sitemaps
+
+
+class TestIterUrls(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpdir.name)
+        self.spider = mock.MagicMock()
+        self.spider.domains = ['docs.openstack.org']
+        self.spider.shard = None
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def _write(self, count, **kwargs):
+        pipeline = pipelines.ExportSitemap(**kwargs)
+        pipeline.spider_opened(self.spider)
+        for i in range(count):
+            pipeline.process_item(
+                {'loc': 'https://docs.openstack.org/%d.html' % i},
+                self.spider)
+        pipeline.spider_closed(self.spider)
+
+    def test_sitemap(self):
+        self._write(3)
+
+        self.assertEqual(['https://docs.openstack.org/%d.html' % i
+                          for i in range(3)],
+                         list(sitemaps.iter_urls(
+                             'sitemap_docs.openstack.org.xml')))
+
+    def test_compressed_sitemap_index(self):
+        self._write(25, max_urls=10, compress=True)
+
+        path = os.path.join(self.tmpdir.name,
+                            'sitemap_docs.openstack.org-index.xml')
+        self.assertEqual(['https://docs.openstack.org/%d.html' % i
+                          for i in range(25)],
+                         list(sitemaps.iter_urls(path)))
+
+    def test_missing_shard(self):
+        self._write(15, max_urls=10)
+        os.remove('sitemap_docs.openstack.org-0002.xml')
+
+        urls = list(sitemaps.iter_urls(
+            'sitemap_docs.openstack.org-index.xml'))
+        self.assertEqual(10, len(urls))
+
+    def test_merge(self):
+        self._write(3)
+        os.rename('sitemap_docs.openstack.org.xml', 'part-1.xml')
+        self._write(5)
+        os.rename('sitemap_docs.openstack.org.xml', 'part-2.xml')
+
+        entries = sitemaps.merge(['part-2.xml', 'part-1.xml'])
+
+        self.assertEqual(sorted('https://docs.openstack.org/%d.html' % i
+                                for i in range(5)),
+                         [entry['loc'] for entry in entries])
+
+    def test_merge_keeps_latest_lastmod(self):
+        for name, lastmod in (('a.xml', '2026-10-16'),
+                              ('b.xml', '2026-10-12')):
+            with open(name, 'w') as sitemap:
+                sitemap.write(
+                    '<urlset xmlns="%s"><url><loc>https://d/</loc>'
+                    '<lastmod>%s</lastmod><priority>1.0</priority></url>'
+                    '</urlset>' % (pipelines.SITEMAP_NS, lastmod))
+
+        self.assertEqual([{'loc': 'https://d/', 'lastmod': '2026-10-16',
+                           'priority': '1.0'}],
+                         sitemaps.merge(['b.xml', 'a.xml']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import tempfile
+import unittest
+
+from sitemap.generator import state
+
+
+class TestUrlStateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'state.db')
+        self.store = state.UrlStateStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_unknown_url(self):
+        self.assertIsNone(self.store.get('https://docs.openstack.org/'))
+
+    def test_set_and_get(self):
+        self.store.set('https://docs.openstack.org/', '"abc"',
+                       'Mon, 12 Oct 2026 10:00:00 GMT',
+                       '2026-10-12T10:00:00+00:00')
+
+        known = self.store.get('https://docs.openstack.org/')
+        self.assertEqual('"abc"', known.etag)
+        self.assertEqual('Mon, 12 Oct 2026 10:00:00 GMT',
+                         known.last_modified)
+        self.assertEqual('2026-10-12T10:00:00+00:00', known.lastmod)
+
+    def test_state_is_persistent(self):
+        self.store.set('https://docs.openstack.org/', None, None,
+                       '2026-10-12T10:00:00+00:00')
+        self.store.close()
+
+        self.store = state.UrlStateStore(self.path)
+        self.assertEqual('2026-10-12T10:00:00+00:00',
+                         self.store.get('https://docs.openstack.org/').lastmod)
+
+    def test_delete(self):
+        self.store.set('https://docs.openstack.org/', None, None, None)
+        self.store.delete('https://docs.openstack.org/')
+
+        self.assertIsNone(self.store.get('https://docs.openstack.org/'))
+
+    def test_links(self):
+        url = 'https://docs.openstack.org/'
+        self.assertEqual([], self.store.get_links(url))
+        self.store.set_links(url, [url + 'nova/', url + 'swift/'])
+
+        self.assertEqual([url + 'nova/', url + 'swift/'],
+                         self.store.get_links(url))
+
+        self.store.delete(url)
+        self.assertEqual([], self.store.get_links(url))
+
+    def test_urls_ignores_new_urls(self):
+        self.store.BATCH_SIZE = 2
+        for i in range(5):
+            self.store.set('https://docs.openstack.org/%d' % i,
+                           None, None, None)
+
+        urls = []
+        for url in self.store.urls():
+            urls.append(url)
+            self.store.set(url + '/new', None, None, None)
+            self.store.set(url, '"etag"', None, None)
+
+        self.assertEqual(['https://docs.openstack.org/%d' % i
+                          for i in range(5)], urls)
+
+    def test_content_hash(self):
+        self.store.set('https://docs.openstack.org/', None, None, None,
+                       'abc')
+
+        self.assertEqual('abc',
+                         self.store.get('https://docs.openstack.org/')
+                         .content_hash)
+
+    def _crawl(self, pages):
+        self.store.close()
+        self.store = state.UrlStateStore(self.path)
+        for url, lastmod in pages:
+            if self.store.get(url) and lastmod is None:
+                self.store.touch(url)
+            else:
+                self.store.set(url, None, None, lastmod)
+        changes = list(self.store.changes())
+        self.store.finish([url for change, url, lastmod in changes
+                           if change == state.REMOVED])
+        return [(change, url) for change, url, lastmod in changes]
+
+    def test_changes(self):
+        self.assertEqual([(state.ADDED, 'a'), (state.ADDED, 'b'),
+                          (state.ADDED, 'c')],
+                         self._crawl([('a', '1'), ('b', '1'), ('c', '1')]))
+        self.assertEqual([(state.CHANGED, 'b'), (state.REMOVED, 'c'),
+                          (state.ADDED, 'd')],
+                         self._crawl([('a', '1'), ('b', '2'), ('d', '1')]))
+        self.assertEqual([],
+                         self._crawl([('a', '1'), ('b', None), ('d', '1')]))
+        self.assertIsNone(self.store.get('c'))
+
+    def test_unfinished_crawl_is_resumed(self):
+        generation = self.store.generation
+        self.store.close()
+
+        self.store = state.UrlStateStore(self.path)
+        self.assertEqual(generation, self.store.generation)
+        self.store.finish()
+        self.store.close()
+
+        self.store = state.UrlStateStore(self.path)
+        self.assertEqual(generation + 1, self.store.generation)
+
+    def test_redirects(self):
+        self.store.set_redirect('https://docs.openstack.org/infra/',
+                                'https://docs.opendev.org/')
+        self.store.finish()
+        self.store.close()
+
+        self.store = state.UrlStateStore(self.path)
+        self.assertEqual(
+            {'https://docs.openstack.org/infra/': 'https://docs.opendev.org/'},
+            self.store.redirects())
+
+    def test_old_redirects_expire(self):
+        self.store.set_redirect('https://docs.openstack.org/infra/',
+                                'https://docs.opendev.org/')
+        for i in range(state.REDIRECT_MAX_AGE):
+            self.store.finish()
+            self.store.close()
+            self.store = state.UrlStateStore(self.path)
+
+        self.assertEqual({}, self.store.redirects())
+
+    def test_old_store_is_upgraded(self):
+        self.store.close()
+        os.remove(self.path)
+        connection = state.sqlite3.connect(self.path)
+        connection.execute(
+            'CREATE TABLE urls (url TEXT PRIMARY KEY, etag TEXT, '
+            'last_modified TEXT, lastmod TEXT)')
+        connection.execute("INSERT INTO urls VALUES ('a', NULL, NULL, '1')")
+        connection.commit()
+        connection.close()
+
+        self.store = state.UrlStateStore(self.path)
+        self.assertEqual(state.UrlState(None, None, '1', None),
+                         self.store.get('a'))
+        self.assertEqual([(state.REMOVED, 'a', '1')],
+                         list(self.store.changes()))
+
+
+if __name__ == '__main__':
+    unittest.main()